@@ -0,0 +1,48 @@
+"""
+Helpers shared by the benchmarks in this directory.
+"""
+
+import time
+
+
+def generate_program(lines: int) -> str:
+    """
+    Generate a TIP program of roughly `lines` lines, made of many small
+    functions that use most of the language.
+    """
+    functions = []
+    count = 0
+    i = 0
+    while count < lines:
+        functions.append(f"""f{i}(a, b) {{
+    var x, y, p, r;
+    x = a + b * 2 - (a / 3);
+    p = alloc null;
+    *p = x;
+    r = {{f: x, g: &y}};
+    y = r.f;
+    if (x > 0) {{
+        y = y + 1;
+    }} else {{
+        y = -1;
+    }}
+    while (y < 10) {{
+        y = y + f{i}(x, *p);
+        output y;
+    }}
+    return y;
+}}
+""")
+        count += 17
+        i += 1
+    return ''.join(functions)
+
+
+def measure(func, *args, repeat=3, **kwargs) -> float:
+    """ best wall-clock time of `repeat` runs, in seconds """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,82 @@
+"""
+Measure building the control flow graph of one function of a hundred
+thousand statements, then visiting every node through its successors, and
+the same visit over the compressed sparse row view of the graph, and
+removing every other assignment.
+Usage:
+    python cfg.py [statements]
+"""
+
+import sys
+
+from tipy.cfg import Graph
+from tipy.parser import parse
+from bench import measure
+
+
+def generate(statements: int) -> str:
+    """ straight-line code with a conditional every hundred statements """
+    text = ['main(a) {\n    var x, y;\n    x = a;\n']
+    for i in range(1, statements):
+        if i % 100 == 0:
+            text.append(f'    if (x > {i}) {{ y = x; }} else {{ y = a; }}\n')
+        else:
+            text.append(f'    x = x + y * {i};\n')
+    text.append('    return x;\n}\n')
+    return ''.join(text)
+
+
+def traverse(graph: Graph) -> int:
+    entry = graph.nodes[0]
+    seen = {entry}
+    stack = [entry]
+    while stack:
+        for succ in stack.pop().succ_nodes():
+            if succ not in seen:
+                seen.add(succ)
+                stack.append(succ)
+    return len(seen)
+
+
+def traverse_csr(graph: Graph) -> int:
+    csr = graph.csr()
+    offsets, targets = csr.offsets, csr.targets
+    seen = bytearray(len(graph.nodes))
+    seen[0] = 1
+    stack = [0]
+    count = 1
+    while stack:
+        i = stack.pop()
+        for k in range(offsets[i], offsets[i + 1]):
+            succ = targets[k]
+            if not seen[succ]:
+                seen[succ] = 1
+                count += 1
+                stack.append(succ)
+    return count
+
+
+def build_and_traverse(prog) -> int:
+    return traverse(Graph.build_prog(prog))
+
+
+def build_and_remove(prog) -> int:
+    graph = Graph.build_prog(prog)
+    for node in graph.nodes[2:-1:2]:
+        graph.remove_node(node)
+    return len(graph.nodes)
+
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    prog = parse(generate(statements), 'lalr', True)
+    assert build_and_traverse(prog) == len(Graph.build_prog(prog).nodes)
+    seconds = measure(build_and_traverse, prog, repeat=3)
+    print(f'{statements} statements  {seconds:8.3f}s')
+    graph = Graph.build_prog(prog)
+    assert traverse_csr(graph) == traverse(graph)
+    for name, func in (('nodes', traverse), ('csr', traverse_csr)):
+        seconds = measure(func, graph, repeat=3)
+        print(f'traverse {name:5}  {seconds:8.3f}s')
+    seconds = measure(build_and_remove, prog, repeat=3)
+    print(f'build and remove half  {seconds:8.3f}s')
@@ -0,0 +1,35 @@
+"""
+Measure how building control flow graphs scales with the number of functions
+and with the number of `if` and `while` statements per function; the time
+per statement should stay flat.
+Usage:
+    python cfg_scaling.py
+"""
+
+from tipy.cfg import Graph
+from tipy.parser import parse
+from bench import measure
+
+
+def generate(functions: int, branches: int) -> str:
+    """ functions with `branches` alternating `if` and `while` statements """
+    text = []
+    for f in range(functions):
+        text.append(f'f{f}(a) {{\n    var x;\n    x = a;\n')
+        for i in range(branches):
+            if i % 2 == 0:
+                text.append(f'    if (x > {i}) {{ x = x - 1; }}\n')
+            else:
+                text.append(f'    while (x > {i}) {{ x = x - 1; }}\n')
+        text.append('    return x;\n}\n')
+    return ''.join(text)
+
+
+if __name__ == '__main__':
+    for functions, branches in ((100, 10), (1000, 10), (10000, 10),
+                                (10, 100), (10, 1000), (10, 10000)):
+        prog = parse(generate(functions, branches), 'lalr', True)
+        seconds = measure(Graph.build_prog, prog, repeat=3)
+        statements = functions * branches
+        print(f'{functions:6} functions x {branches:6} branches  '
+              f'{seconds:8.3f}s  {seconds / statements * 1e6:6.2f}us/branch')
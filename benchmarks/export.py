@@ -0,0 +1,37 @@
+"""
+Measure writing the control flow graph of a program with about a million
+edges as DOT and as JSON to a file.
+Usage:
+    python export.py [edges]
+"""
+
+import os
+import sys
+import tempfile
+
+from tipy.ast import Program
+from tipy.cfg import Graph
+from tipy.parser import parse
+from bench import generate_program, measure
+
+if __name__ == '__main__':
+    edges = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    # repeat the functions of a small program, each copy gets its own nodes
+    program = parse(generate_program(1700), 'lalr', True)
+    copies = max(1, edges // len(Graph.build_prog(program).edges))
+    graph = Graph.build_prog(Program(program.functions * copies))
+    for node in graph.nodes:
+        str(node)   # labels are cached, measure the export alone
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cfg')
+
+        def export(method):
+            with open(path, 'w') as fp:
+                method(fp)
+
+        for name, method in (('dot', graph.write_dot),
+                             ('json', graph.write_json)):
+            seconds = measure(export, method, repeat=3)
+            size = os.path.getsize(path) / 1e6
+            print(f'{name:4} {len(graph.nodes)} nodes {len(graph.edges)} '
+                  f'edges {seconds:8.3f}s  {size:6.1f}MB')
@@ -0,0 +1,29 @@
+"""
+Compare time and peak memory of building the AST from a parse tree
+(`parse(text, 'lalr')`) and from the parser callbacks (`fused=True`).
+Usage:
+    python fused.py [lines]
+"""
+
+import sys
+import tracemalloc
+
+from tipy.parser import parse
+from bench import generate_program, measure
+
+
+def peak_memory(func, *args, **kwargs) -> int:
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    text = generate_program(lines)
+    for fused in (False, True):
+        seconds = measure(parse, text, 'lalr', fused, repeat=1)
+        peak = peak_memory(parse, text, 'lalr', fused)
+        print(f'fused={fused!s:5} {seconds:8.3f}s  peak {peak / 2**20:8.1f} MiB')
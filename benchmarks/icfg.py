@@ -0,0 +1,41 @@
+"""
+Measure building the interprocedural control flow graph of programs of
+growing numbers of functions, each calling the previous ones directly and
+through a function pointer; the time per function should stay flat.
+Usage:
+    python icfg.py
+"""
+
+from tipy.cfg import ICFG
+from tipy.parser import parse
+from bench import measure
+
+
+def generate(functions: int) -> str:
+    text = ['f0(a) {\n    return a;\n}\n']
+    for f in range(1, functions):
+        text.append(f"""f{f}(a) {{
+    var x, p;
+    x = f{f - 1}(a);
+    p = f{f // 2};
+    while (x > 0) {{
+        x = p(x - 1);
+    }}
+    return x;
+}}
+""")
+    return ''.join(text)
+
+
+def build(prog) -> ICFG:
+    icfg = ICFG.build_prog(prog, lambda call, icfg: ['f0'])
+    icfg.resolve()
+    return icfg
+
+
+if __name__ == '__main__':
+    for functions in (1000, 10000, 100000):
+        prog = parse(generate(functions), 'lalr', True)
+        seconds = measure(build, prog, repeat=3)
+        print(f'{functions:6} functions  {seconds:8.3f}s  '
+              f'{seconds / functions * 1e6:6.1f}us/function')
@@ -0,0 +1,43 @@
+"""
+Compare the peak memory and time of parsing a file at once with
+`parse_file` and one function at a time with `iter_functions`.
+Usage:
+    python iter_functions.py [lines]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tipy.parser import parse_file, iter_functions
+from bench import generate_program
+
+
+def whole(path):
+    return len(parse_file(path, 'lalr', True).functions)
+
+
+def streaming(path):
+    return sum(1 for _ in iter_functions(path, 'lalr', True))
+
+
+if __name__ == '__main__':
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'program.tip')
+        with open(path, 'w') as f:
+            f.write(generate_program(lines))
+        # build the parser outside the measurement
+        parse_file(path, 'lalr', True)
+        for name, func in (('parse_file', whole),
+                           ('iter_functions', streaming)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = func(path)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'{name:15} {count} functions {seconds:8.3f}s  '
+                  f'peak {peak / 2**20:8.1f} MiB')
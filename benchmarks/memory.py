@@ -0,0 +1,42 @@
+"""
+Measure the memory retained by a parsed program, per AST node.
+Usage:
+    python memory.py [lines]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from tipy.ast import Id
+from tipy.parser import parse
+from bench import generate_program
+
+
+def count_nodes(node) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (list, tuple)):
+            stack.extend(node)
+        elif hasattr(node, '__dataclass_fields__') or isinstance(node, Id):
+            count += 1
+            if not isinstance(node, Id):
+                stack.extend(getattr(node, f) for f in node.__dataclass_fields__)
+    return count
+
+
+if __name__ == '__main__':
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    text = generate_program(lines)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    prog = parse(text, 'lalr', fused=True)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    nodes = count_nodes(prog)
+    print(f'{nodes} nodes  {retained / 2**20:8.1f} MiB  '
+          f'{retained / nodes:6.1f} bytes/node')
@@ -0,0 +1,17 @@
+"""
+Compare parsing throughput of the Earley and LALR frontends.
+Usage:
+    python parse.py [lines]
+"""
+
+import sys
+
+from tipy.parser import parse
+from bench import generate_program, measure
+
+if __name__ == '__main__':
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    text = generate_program(lines)
+    for mode in ('earley', 'lalr'):
+        seconds = measure(parse, text, mode)
+        print(f'{mode:8} {seconds:8.3f}s  {lines / seconds:10.0f} lines/s')
@@ -0,0 +1,30 @@
+"""
+Measure how `parse_files` scales with the number of worker processes.
+Usage:
+    python parse_files.py [files] [lines per file]
+"""
+
+import os
+import sys
+import tempfile
+
+from tipy.parser import parse_files
+from bench import generate_program, measure
+
+if __name__ == '__main__':
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        text = generate_program(lines)
+        for i in range(files):
+            paths.append(os.path.join(tmp, f'{i}.tip'))
+            with open(paths[-1], 'w') as f:
+                f.write(text)
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            seconds = measure(parse_files, paths, workers, 'lalr', True,
+                              repeat=1)
+            print(f'{workers:3} workers {seconds:8.3f}s  '
+                  f'{files / seconds:8.0f} files/s')
+            workers *= 2
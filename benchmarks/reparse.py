@@ -0,0 +1,34 @@
+"""
+Measure `reparse` after single character edits of a large program, against
+parsing the edited text from scratch.
+Usage:
+    python reparse.py [lines] [edits]
+"""
+
+import random
+import sys
+import time
+
+from tipy.parser import parse, reparse, Edit
+from bench import generate_program, measure
+
+if __name__ == '__main__':
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    text = generate_program(lines)
+    program = parse(text, 'lalr', True)
+    seconds = measure(parse, text, 'lalr', True, repeat=1)
+    print(f'parse    {seconds:8.3f}s')
+    random.seed(0)
+    for name, replacement in (('replace', '7'), ('newline', '\n')):
+        total = 0
+        for _ in range(edits):
+            # the constant of `b * 2`, the edit keeps the program valid
+            start = text.index('* 2', random.randrange(len(text) - 1000)) + 2
+            edit = Edit(start, start + 1, replacement)
+            # reparse moves positions in place, so each edit runs once
+            begin = time.perf_counter()
+            program = reparse(program, text, edit, 'lalr', True)
+            total += time.perf_counter() - begin
+            text = edit.apply(text)
+        print(f'{name:8} {total / edits * 1000:8.3f}ms per edit')
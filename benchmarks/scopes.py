@@ -0,0 +1,34 @@
+"""
+Measure name resolution (`SymbolTable.build`) on a program of ten thousand
+functions with a hundred locals each. Every local has a distinct name, so
+scoping costs must not grow with the number of names seen so far.
+Usage:
+    python scopes.py [functions] [locals per function]
+"""
+
+import sys
+
+from tipy.ast import *
+from tipy.symbol import SymbolTable
+from bench import measure
+
+
+def generate(functions: int, variables: int) -> Program:
+    """ build the AST directly, parsing a million lines would dominate """
+    result = []
+    for f in range(functions):
+        ids = [Id(f'v{f}_{i}') for i in range(variables)]
+        stmts = [Assign(Id(ids[i].value), BinaryExpr(
+            Id('a'), Operator.ADD, Id(ids[i - 1].value)))
+            for i in range(variables)]
+        result.append(Function(Id(f'f{f}'), Parameters([Id('a')]), FunBlock(
+            stmts, [Vardecl(Parameters(ids))], Return(Id(ids[-1].value)))))
+    return Program(result)
+
+
+if __name__ == '__main__':
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    variables = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    prog = generate(functions, variables)
+    seconds = measure(SymbolTable.build, prog, repeat=3)
+    print(f'{functions} functions x {variables} locals  {seconds:8.3f}s')
@@ -0,0 +1,32 @@
+"""
+Compare the size and speed of pickle and `Program.to_bytes()`.
+Usage:
+    python serialize.py [lines]
+"""
+
+import pickle
+import sys
+
+from tipy.ast import Program
+from tipy.parser import parse
+from bench import generate_program, measure
+
+if __name__ == '__main__':
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    prog = parse(generate_program(lines), 'lalr', fused=True)
+    formats = {
+        'pickle': (lambda p: pickle.dumps(p, pickle.HIGHEST_PROTOCOL),
+                   pickle.loads),
+        'tipy': (Program.to_bytes, Program.from_bytes),
+    }
+    results = []
+    for name, (dumps, loads) in formats.items():
+        data = dumps(prog)
+        dump_time = measure(dumps, prog)
+        load_time = measure(loads, data)
+        results.append((len(data), load_time))
+        print(f'{name:8} {len(data) / 2**10:10.1f} KiB  dump {dump_time:7.3f}s'
+              f'  load {load_time:7.3f}s')
+    (pickle_size, pickle_load), (tipy_size, tipy_load) = results
+    print(f'tipy is {pickle_size / tipy_size:.1f}x smaller, loads '
+          f'{pickle_load / tipy_load:.1f}x faster')
@@ -0,0 +1,29 @@
+"""
+Measure the startup cost of a short-lived process parsing one small file:
+importing tipy.parser, then the first parse with a cold and a warm grammar cache.
+Usage:
+    python startup.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+SCRIPT = """
+import time
+start = time.perf_counter()
+import tipy.parser
+imported = time.perf_counter()
+tipy.parser.parse("main() { return 0; }", mode='lalr')
+parsed = time.perf_counter()
+print(f'{(imported - start) * 1000:8.1f}ms import {(parsed - imported) * 1000:8.1f}ms first parse')
+"""
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(os.environ, TIPY_CACHE_DIR=cache)
+        for label in ('cold', 'warm'):
+            result = subprocess.run([sys.executable, '-c', SCRIPT], env=env,
+                                    capture_output=True, text=True, check=True)
+            print(f'{label} cache {result.stdout.strip()}')
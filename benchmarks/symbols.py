@@ -0,0 +1,36 @@
+"""
+Measure name resolution (`SymbolTable.build`) on a program with tens of
+thousands of variables, and binding one of its functions again
+(`SymbolTable.rebuild`).
+Usage:
+    python symbols.py [functions] [variables per function]
+"""
+
+import sys
+
+from tipy.parser import parse
+from tipy.symbol import SymbolTable
+from bench import measure
+
+
+def generate(functions: int, variables: int) -> str:
+    text = []
+    for f in range(functions):
+        names = [f'v{f}_{i}' for i in range(variables)]
+        text.append(f'f{f}(a) {{\n    var {", ".join(names)};\n')
+        for i, name in enumerate(names):
+            text.append(f'    {name} = a + {names[i - 1]} * {names[i // 2]};\n')
+        text.append(f'    return {names[-1]};\n}}\n')
+    return ''.join(text)
+
+
+if __name__ == '__main__':
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    variables = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    prog = parse(generate(functions, variables), 'lalr', fused=True)
+    seconds = measure(SymbolTable.build, prog, repeat=10)
+    print(f'{functions} functions x {variables} variables  {seconds:8.3f}s')
+    st = SymbolTable.build(prog)
+    function = prog.functions[len(prog.functions) // 2]
+    seconds = measure(st.rebuild, function, function, repeat=10)
+    print(f'rebuild one function{" " * 19}{seconds:8.3f}s')
@@ -0,0 +1,26 @@
+"""
+Measure a full `AstVisitor` traversal of an AST of about a million nodes.
+Usage:
+    python visitor.py [nodes]
+"""
+
+import sys
+
+from tipy.ast import Program
+from tipy.parser import parse
+from tipy.visitor import AstVisitor
+from bench import generate_program, measure
+from memory import count_nodes
+
+if __name__ == '__main__':
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    # repeat the functions of a small program, the traversal does not care
+    program = parse(generate_program(1700), 'lalr', True)
+    copies = max(1, nodes // count_nodes(program))
+    program = Program(program.functions * copies)
+    count = count_nodes(program)
+    for name, walk in (('visit', lambda: AstVisitor().visit(program)),
+                       ('accept', lambda: program.accept(AstVisitor()))):
+        seconds = measure(walk, repeat=5)
+        print(f'{name:7} {count} nodes {seconds:8.3f}s  '
+              f'{count / seconds / 1e6:6.2f}M nodes/s')
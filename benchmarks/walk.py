@@ -0,0 +1,64 @@
+"""
+Measure collecting the identifiers of an AST of about a million nodes with
+`walk`, `AstWalker` and `AstVisitor`.
+Usage:
+    python walk.py [nodes]
+"""
+
+import sys
+
+from tipy.ast import Id, Program, walk
+from tipy.parser import parse
+from tipy.visitor import AstVisitor, AstWalker
+from bench import generate_program, measure
+from memory import count_nodes
+
+
+class Walker(AstWalker):
+    def __init__(self):
+        self.ids = []
+
+    def enter_id(self, node):
+        self.ids.append(node)
+
+
+class Visitor(AstVisitor):
+    def __init__(self):
+        self.ids = []
+
+    def visit_id(self, node):
+        self.ids.append(node)
+
+
+def by_walk(program):
+    return [node for node in walk(program) if type(node) is Id]
+
+
+def by_walker(program):
+    walker = Walker()
+    walker.walk(program)
+    return walker.ids
+
+
+def by_visitor(program):
+    visitor = Visitor()
+    visitor.visit(program)
+    return visitor.ids
+
+
+if __name__ == '__main__':
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    program = parse(generate_program(1700), 'lalr', True)
+    copies = max(1, nodes // count_nodes(program))
+    program = Program(program.functions * copies)
+    count = count_nodes(program)
+    assert len(by_walk(program)) == len(by_walker(program)) \
+        == len(by_visitor(program))
+    times = {}
+    for name, collect in (('walk', by_walk), ('AstWalker', by_walker),
+                          ('AstVisitor', by_visitor)):
+        seconds = times[name] = measure(lambda: collect(program), repeat=5)
+        print(f'{name:10} {count} nodes {seconds:8.3f}s  '
+              f'{count / seconds / 1e6:6.2f}M nodes/s')
+    print(f'walk is {times["AstWalker"] / times["walk"]:.1f}x AstWalker, '
+          f'{times["AstVisitor"] / times["walk"]:.1f}x AstVisitor')
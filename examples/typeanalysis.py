@@ -39,4 +39,4 @@ if __name__ == '__main__':
     result = TypeAnalysis.run(prog)
     for expr in result.map2expr.values():
         if isinstance(expr, Id):
-            print(f"{expr} line:{expr.token.line} -> {str(result.get_type(expr))}")
+            print(f"{expr} line:{expr.line} -> {str(result.get_type(expr))}")
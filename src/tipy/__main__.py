@@ -0,0 +1,31 @@
+"""
+Command line interface of tipy.
+Usage:
+    tipy cache clear    remove all cached programs and grammars
+    tipy cache info     show the location and size of the parse cache
+"""
+
+import argparse
+
+from .cache import ParseCache, clear_all
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tipy')
+    commands = parser.add_subparsers(dest='command', required=True)
+    cache = commands.add_parser('cache', help='manage the on-disk caches')
+    cache.add_argument('action', choices=['clear', 'info'])
+    args = parser.parse_args(argv)
+
+    if args.command == 'cache':
+        if args.action == 'clear':
+            clear_all()
+        else:
+            cache = ParseCache()
+            stats = cache.stats()
+            print(f"{cache.directory}: {stats['entries']} entries, "
+                  f"{stats['bytes']} bytes")
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -3,10 +3,11 @@ from dataclasses import dataclass
 from .analysis import Analysis, Constraint
 from ..ast import *
 from ..symbol import SymbolTable
-from ..visitor import AstVisitor
+from ..visitor import AstWalker
 from ..solver import UnionFindSolver
 from ..type import *
 from ..log import get_logger
+from ..util import TypeError
 
 Logger = get_logger(__name__)
 Logger.setLevel('INFO')
@@ -30,14 +31,14 @@ class TypeResult:
         return self.map2type[id(expr)]
 
 
-class TypeConstraitCollection(AstVisitor):
+class TypeConstraitCollection(AstWalker):
     """
     collect type constraints from an AST
     """
     @classmethod
     def collect(cls, source: Program) -> 'TypeConstraitCollection':
         tcc = TypeConstraitCollection(source)
-        tcc.visit_program(source)
+        tcc.walk(source)
         return tcc
 
     def __init__(self, source: Program):
@@ -57,46 +58,78 @@ class TypeConstraitCollection(AstVisitor):
             close the type constraint term, find the final result of t
             - t: the type to be closed
             - typevar: the type variable that t should ignore, it is used to handle the case of circular reference
-            """
 
-            # t is in recursive type, do not try to close it
-            if typevar is not None and isinstance(typevar, TypeVar) and t == typevar:
-                return t
-
-            origin = t
-            t = t.find_parent()
-            # circular reference
-            if t.contain(origin):
-                Logger.debug(f'circular reference: {origin} -> {t}')
-                match origin:  # 1 -> pointer(1)
-                    case TypeVar(_):
-                        # create a new type variable
-                        t = RecursionType(origin, t)
-                    case _: # pragma: no cover
-                        print('circular reference not handled')
-                        breakpoint()
-
-            match t:
-                case PointerType(inner):
-                    return PointerType(close(inner, typevar))
-                case FunctionType(params, return_type):
-                    params = [close(param, typevar) for param in params]
-                    return_type = close(return_type)
-                    return FunctionType(params, return_type)
-                case RecursionType(var, type_):
-                    return RecursionType(var, close(type_, var))
-                case _:
-                    return t
-
-        for (id, type_) in self._map2type.items():
+            parts are closed with an explicit stack of (type, typevar, None)
+            to close and (type, None, key) to rebuild from its closed parts;
+            closing a type inside itself with the same typevar never ends
+            """
+            results = []
+            stack = [(t, typevar, None)]
+            # (type, typevar) being closed
+            active = set()
+            while stack:
+                t, typevar, rebuild = stack.pop()
+                if rebuild is not None:
+                    active.discard(rebuild)
+                    match t:
+                        case PointerType(_):
+                            results.append(PointerType(results.pop()))
+                        case FunctionType(params, _):
+                            parts = results[len(results) - len(params) - 1:]
+                            del results[len(results) - len(params) - 1:]
+                            results.append(FunctionType(parts[:-1], parts[-1]))
+                        case RecursionType(var, _):
+                            results.append(RecursionType(var, results.pop()))
+                    continue
+
+                # t is in recursive type, do not try to close it
+                if typevar is not None and isinstance(typevar, TypeVar) and t == typevar:
+                    results.append(t)
+                    continue
+
+                origin = t
+                t = t.find_parent()
+                # circular reference
+                if t.contain(origin):
+                    Logger.debug(f'circular reference: {origin} -> {t}')
+                    match origin:  # 1 -> pointer(1)
+                        case TypeVar(_):
+                            # create a new type variable
+                            t = RecursionType(origin, t)
+                        case _: # pragma: no cover
+                            print('circular reference not handled')
+                            breakpoint()
+
+                key = (id(t), id(typevar))
+                if key in active:
+                    raise TypeError('Cannot close an infinite type')
+                match t:
+                    case PointerType(inner):
+                        stack.append((t, None, key))
+                        stack.append((inner, typevar, None))
+                    case FunctionType(params, return_type):
+                        stack.append((t, None, key))
+                        stack.append((return_type, None, None))
+                        for param in reversed(params):
+                            stack.append((param, typevar, None))
+                    case RecursionType(var, type_):
+                        stack.append((t, None, key))
+                        stack.append((type_, var, None))
+                    case _:
+                        results.append(t)
+                        continue
+                active.add(key)
+            return results.pop()
+
+        for (expr_id, type_) in self._map2type.items():
             result = close(type_)
             # if type contains recursive type, replace it with the recursive type
             # **IMPORTANT: I don't if this is correct**
             recursive = result.contain_class(RecursionType)
             if recursive is not None:
-                self.map2type[id] = recursive
+                self.map2type[expr_id] = recursive
             else:
-                self.map2type[id] = result
+                self.map2type[expr_id] = result
 
         return TypeResult(self.map2expr, self.map2type)
 
@@ -121,16 +154,15 @@ class TypeConstraitCollection(AstVisitor):
     def _add(self, constraint: Constraint):
         self.constraints.append(constraint)
 
-    def visit_input(self, node: Input):
+    def enter_input(self, node: Input):
         tv = self._get_typevar(node)
         self._add(Equal(tv, IntType()))
 
-    def visit_output(self, node: Output):
+    def enter_output(self, node: Output):
         tv = self._get_typevar(node.expr)
         self._add(Equal(tv, IntType()))
-        node.expr.accept(self)
 
-    def visit_const(self, node: Const):
+    def enter_const(self, node: Const):
         tv = self._get_typevar(node)
         match node.type_:
             case AstType.INT | AstType.BOOL:
@@ -143,7 +175,7 @@ class TypeConstraitCollection(AstVisitor):
             case _: # pragma: no cover
                 raise TypeError(f'Unknown type {node.type_}')
 
-    def visit_assign(self, node: Assign):
+    def enter_assign(self, node: Assign):
         tv_left = self._get_typevar(node.name)
         tv_right = self._get_typevar(node.expr)
         self._add(Equal(tv_left, tv_right))
@@ -153,24 +185,18 @@ class TypeConstraitCollection(AstVisitor):
                 self._add(Equal(tv_inner, PointerType(tv_right)))
             case _:
                 pass
-        node.expr.accept(self)
-        node.name.accept(self)
+        # the value before the target
+        return [node.expr, node.name]
 
-    def visit_if(self, node: If):
+    def enter_if(self, node: If):
         tv = self._get_typevar(node.cond)
         self._add(Equal(tv, IntType()))
-        node.cond.accept(self)
-        node.then.accept(self)
-        if node.else_:
-            node.else_.accept(self)
 
-    def visit_while(self, node: While):
+    def enter_while(self, node: While):
         tv = self._get_typevar(node.cond)
         self._add(Equal(tv, IntType()))
-        node.cond.accept(self)
-        node.body.accept(self)
 
-    def visit_function(self, node: Function):
+    def enter_function(self, node: Function):
         returnstmt = node.body.returnstmt
         tv_func = self._get_typevar(node)
         tv_params = [self._get_typevar(param)
@@ -183,12 +209,12 @@ class TypeConstraitCollection(AstVisitor):
         if node.name.value == 'main':
             self._add(Equal(tv_return, IntType()))
 
-        node.body.accept(self)
+        return [node.body]
 
-    def visit_vardecl(self, node: Vardecl):
-        pass
+    def enter_vardecl(self, node: Vardecl):
+        return []
 
-    def visit_call(self, node: Call):
+    def enter_call(self, node: Call):
         """
         E(E1,..., En): [[E]] = ([[E1]], ..., [[En]]) -> [[node]]
         """
@@ -197,44 +223,38 @@ class TypeConstraitCollection(AstVisitor):
         typ = FunctionType(tv_args, tv_expr)
         tv_name = self._get_typevar(node.name)
         self._add(Equal(tv_name, typ))
-        node.name.accept(self) # important:
-        for arg in node.args:
-            arg.accept(self)
 
-    def visit_alloc(self, node: Alloc):
+    def enter_alloc(self, node: Alloc):
         """
         alloc E: [[alloc E]] = ↑[[E]]
         """
         tv = self._get_typevar(node)
         tv_expr = self._get_typevar(node.expr)
         self._add(Equal(tv, PointerType(tv_expr)))
-        node.expr.accept(self)
 
-    def visit_reference(self, node: Reference):
+    def enter_reference(self, node: Reference):
         """
         &E: [[&E]] = ↑[[E]]
         """
         tv = self._get_typevar(node)
         tv_name = self._get_typevar(node.name)
         self._add(Equal(tv, PointerType(tv_name)))
-        node.name.accept(self)
 
-    def visit_deref(self, node: Deref):
+    def enter_deref(self, node: Deref):
         """
         *E: [[E]] = ↑[[*E]]
         """
         tv = self._get_typevar(node)
         tv_expr = self._get_typevar(node.expr)
         self._add(Equal(PointerType(tv), tv_expr))
-        node.expr.accept(self)
 
-    def visit_id(self, node: Id):
+    def enter_id(self, node: Id):
         tv = self._get_typevar(node)
         real_node = self._st.get(node)
         tv_node = self._get_typevar(real_node)
         self._add(Equal(tv, tv_node))
 
-    def visit_binary_expr(self, node: BinaryExpr):
+    def enter_binary_expr(self, node: BinaryExpr):
         tv_left = self._get_typevar(node.left)
         tv_right = self._get_typevar(node.right)
         tv_node = self._get_typevar(node)
@@ -246,8 +266,6 @@ class TypeConstraitCollection(AstVisitor):
                 self._add(Equal(tv_node, IntType()))
                 self._add(Equal(tv_left, IntType()))
                 self._add(Equal(tv_right, IntType()))
-        node.left.accept(self)
-        node.right.accept(self)
 
 
 class TypeAnalysis(Analysis):
@@ -0,0 +1,198 @@
+""" Array-backed representation of a `Program`
+
+Nodes are numbered densely in pre-order, so node 0 is the program and the
+subtree of node i is the range [i, ends[i]). Each node is described by the
+same position in parallel arrays:
+
+    kinds    index of the node class in `KINDS`
+    first    offset of the node's first child in `children`
+    counts   number of children
+    ops      the `Operator` of binary and unary expressions,
+             the `AstType` of constants, -1 otherwise
+    values   index of the name of an `Id` in `symbols`, of the value of a
+             `Const` in `constants`, the number of variable declarations
+             of a `FunBlock`, -1 otherwise
+    lines, columns   position of an `Id`, 0 if unknown
+    parents  the parent of the node, -1 for the program
+    ends     one past the last node of the subtree of the node
+
+`children` holds the child IDs of every node in source order, -1 for an
+absent optional child (`If.else_`, `FunBlock.returnstmt`).
+
+Analyses can keep facts in plain lists indexed by node ID; `node(i)` presents
+a node as the `tipy.ast` class it stands for, built on demand and memoized.
+"""
+
+from array import array
+
+from .ast import *
+from .ast import _children
+
+KINDS = (Program, Function, Parameters, FunBlock, Block, Vardecl, Return,
+         If, While, Assign, Output, Error, Id, Const, BinaryExpr, UnaryExpr,
+         Reference, Deref, Alloc, DirectFieldWrite, IndirectFieldWrite,
+         DerefWrite, Record, Access, Input, Call)
+KIND_INDEX = {cls: i for i, cls in enumerate(KINDS)}
+OPERATORS = list(Operator)
+OPERATOR_INDEX = {op: i for i, op in enumerate(OPERATORS)}
+TYPES = list(AstType)
+TYPE_INDEX = {t: i for i, t in enumerate(TYPES)}
+
+
+class Arena:
+    kinds: array
+    first: array
+    counts: array
+    children: array
+    ops: array
+    values: array
+    lines: array
+    columns: array
+    parents: array
+    ends: array
+    symbols: list[str]
+    constants: list[str | int | None]
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.first = array('l')
+        self.counts = array('l')
+        self.children = array('l')
+        self.ops = array('b')
+        self.values = array('l')
+        self.lines = array('l')
+        self.columns = array('l')
+        self.parents = array('l')
+        self.ends = array('l')
+        self.symbols = []
+        self.constants = []
+        self._symbol_index = {}
+        self._views = []
+        self._ids = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @classmethod
+    def from_program(cls, program: Program) -> "Arena":
+        arena = cls()
+        arena._add(program)
+        return arena
+
+    def _symbol(self, name: str) -> int:
+        index = self._symbol_index.get(name)
+        if index is None:
+            index = self._symbol_index[name] = len(self.symbols)
+            self.symbols.append(name)
+        return index
+
+    def _add(self, root: Program) -> None:
+        """ number the nodes in pre-order with an explicit stack """
+        # entries are (node, parent, slot in `children` to fill with its ID),
+        # absent children are left -1; (None, node ID, -1) marks the end of
+        # the subtree of a node
+        stack = [(root, -1, -1)]
+        children = self.children
+        while stack:
+            node, parent, slot = stack.pop()
+            if node is None:
+                if slot == -1:
+                    self.ends[parent] = len(self.kinds)
+                continue
+            i = len(self.kinds)
+            if slot >= 0:
+                children[slot] = i
+            self.parents.append(parent)
+            self.ends.append(0)
+            self.kinds.append(KIND_INDEX[type(node)])
+            op, value, line, column = -1, -1, 0, 0
+            match node:
+                case Id(name):
+                    value = self._symbol(name)
+                    line, column = node.pos or (0, 0)
+                case Const(type_, constant):
+                    op = TYPE_INDEX[type_]
+                    value = len(self.constants)
+                    self.constants.append(constant)
+                case BinaryExpr(_, operator, _) | UnaryExpr(operator, _):
+                    op = OPERATOR_INDEX[operator]
+                case FunBlock(_, varstmts, _):
+                    value = len(varstmts)
+            self.ops.append(op)
+            self.values.append(value)
+            self.lines.append(line)
+            self.columns.append(column)
+            kids = _children(node)
+            start = len(children)
+            self.first.append(start)
+            self.counts.append(len(kids))
+            children.extend([-1] * len(kids))
+            stack.append((None, i, -1))
+            for k in range(len(kids) - 1, -1, -1):
+                stack.append((kids[k], i, start + k))
+
+    def child_ids(self, i: int) -> array:
+        start = self.first[i]
+        return self.children[start:start + self.counts[i]]
+
+    def kind(self, i: int) -> type:
+        return KINDS[self.kinds[i]]
+
+    def node(self, i: int):
+        """
+        The `tipy.ast` node of ID i, the same object on every call;
+        its subtree is built without recursion
+        """
+        views = self._views
+        if not views:
+            views.extend([None] * len(self))
+        if views[i] is not None:
+            return views[i]
+        # children have larger IDs than their parent, build the subtree
+        # from the last node to the first
+        for j in range(self.ends[i] - 1, i - 1, -1):
+            if views[j] is None:
+                views[j] = self._build(j, views)
+                self._ids[id(views[j])] = j
+        return views[i]
+
+    def index(self, node) -> int:
+        """ the ID of a node returned by `node()` """
+        return self._ids[id(node)]
+
+    def to_program(self) -> Program:
+        return self.node(0)
+
+    def _build(self, i: int, views: list):
+        start = self.first[i]
+        kids = [views[c] if c >= 0 else None
+                for c in self.children[start:start + self.counts[i]]]
+        cls = KINDS[self.kinds[i]]
+        if cls is Id:
+            if self.lines[i]:
+                return Id(self.symbols[self.values[i]], self.lines[i],
+                          self.columns[i])
+            return Id(self.symbols[self.values[i]])
+        elif cls is Const:
+            return Const(TYPES[self.ops[i]], self.constants[self.values[i]])
+        elif cls is BinaryExpr:
+            return BinaryExpr(kids[0], OPERATORS[self.ops[i]], kids[1])
+        elif cls is UnaryExpr:
+            return UnaryExpr(OPERATORS[self.ops[i]], kids[0])
+        elif cls is FunBlock:
+            k = self.values[i]
+            return FunBlock(kids[k:-1], kids[:k], kids[-1])
+        elif cls is Vardecl:
+            vardecl = object.__new__(Vardecl)
+            vardecl.ids = kids
+            return vardecl
+        elif cls is Record:
+            return Record(list(zip(kids[::2], kids[1::2])))
+        elif cls is Access:
+            return Access(*kids)
+        elif cls is Call:
+            return Call(kids[0], kids[1:])
+        elif cls in (Program, Parameters, Block):
+            return cls(kids)
+        else:
+            return cls(*kids)
@@ -1,14 +1,37 @@
 import enum
 from dataclasses import dataclass
+from operator import attrgetter
+from typing import Callable, get_origin
 
-from lark import ast_utils, Token
+from .names import NAMES
 
 
-class _Ast(ast_utils.Ast):
+class _Ast:
+    """ AST node, the parser builds a public subclass `FooBar` from the
+    grammar rule `foo_bar`
+
+    nodes are slotted, a program can have millions of them
+
+    `child_fields` names the fields holding child nodes in source order, a
+    field is a node, `None` or a list of nodes; `Record.fields` is a list
+    of (name, value) pairs
+    """
+    __slots__ = ()
+    child_fields: tuple[str, ...] = ()
+
     def accept(self, _visitor): 
         raise NotImplementedError( # pragma: no cover
             'you should implement this method in subclass')
 
+    def dump(self, indent=0):
+        """ print the node as `render` does """
+        print(render(self, indent), end='')
+
+
+class _AsList:
+    """ built from the list of its children instead of one argument each """
+    __slots__ = ()
+
 
 class Operator(enum.Enum):
     ADD = '+'
@@ -34,18 +57,20 @@ class AstType(enum.Enum):
 
 
 class Statement(_Ast):
+    __slots__ = ()
+
     def accept(self, _visitor):
         raise NotImplementedError( # pragma: no cover
             'you should implement this method in subclass')
 
-@dataclass
+@dataclass(slots=True)
 class Expr(_Ast):
     def accept(self, _visitor):
         raise NotImplementedError( # pragma: no cover
             'you should implement this method in subclass')
 
 
-@dataclass
+@dataclass(slots=True)
 class Const(Expr):
     type_: AstType
     value: str | int | None
@@ -53,167 +78,137 @@ class Const(Expr):
     def accept(self, visitor):
         visitor.visit_const(self)
 
-    def dump(self, indent=0):
-        assert (type(self.value) in (str, int, type(None))
-                ), f'Const: Invalid type {type(self.value)}'
-        print(' ' * indent, self.value, end=' ')
-
 
 class Id(Expr):
+    """ An identifier, its name and its position in the source
+
+    sym : int
+        The name interned in `tipy.names.NAMES`, tables of names can be
+        lists indexed by it
+    pos : (line, column) | None
+    """
+    __slots__ = ('value', 'sym', 'pos')
     __match_args__ = tuple(['value'])
 
-    token: Token
     value: str
+    sym: int
+    pos: tuple[int, int] | None
+
+    def __init__(self, value: str, line: int | None = None,
+                 column: int | None = None):
+        self.sym = NAMES.intern(value)
+        self.value = NAMES.names[self.sym]
+        self.pos = None if line is None else (line, column)
+
+    @property
+    def line(self) -> int | None:
+        return self.pos[0] if self.pos is not None else None
 
-    def __init__(self, token: Token):
-        self.token = token
-        self.value = token.value
+    @property
+    def column(self) -> int | None:
+        return self.pos[1] if self.pos is not None else None
 
     def accept(self, visitor):
         visitor.visit_id(self)
 
-    def dump(self, indent=0):
-        assert (type(self.value) == str), f'Id Invalid type {type(self.value)}'
-        print(' ' * indent, self.value, end=' ')
-
-    def __hash__(self) -> int:
-        return id(self)
+    # hashed by identity, the dataclass base makes Expr unhashable
+    __hash__ = object.__hash__
 
     def __str__(self) -> str:
         return f"{self.value}"
 
 
-@dataclass
+@dataclass(slots=True)
 class BinaryExpr(Expr):
     left: Expr
     op: Operator
     right: Expr
+    child_fields = ('left', 'right')
 
     def accept(self, visitor):
         visitor.visit_binary_expr(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, self.op.value, end=' ')
-        self.left.dump()
-        self.right.dump()
-
 
-@dataclass
+@dataclass(slots=True)
 class UnaryExpr(Expr):
     op: Operator
     expr: Expr
+    child_fields = ('expr',)
 
     def accept(self, visitor):
         visitor.visit_unary_expr(self)
 
-    def dump(self, indent=0):
-        assert (type(self.op) ==
-                Operator), f'UExpr: Invalid type {type(self.op)}'
-        print(' ' * indent, self.op.value, end=' ')
-        self.expr.dump()
-
 
-@dataclass
+@dataclass(slots=True)
 class Reference(Expr):
     name: Id
+    child_fields = ('name',)
 
     def accept(self, visitor):
         visitor.visit_reference(self)
 
-    def dump(self, indent=0):
-        assert (type(self.name) == Id), f'Ref Invalid type {type(self.name)}'
-        print(' ' * indent, '&', self.name, end=' ')
-
 
-@dataclass
+@dataclass(slots=True)
 class Deref(Expr):
     expr: Expr
+    child_fields = ('expr',)
 
     def accept(self, visitor):
         visitor.visit_deref(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, '*', end=' ')
-        self.expr.dump()
-
 
-@dataclass
+@dataclass(slots=True)
 class Alloc(Expr):
     expr: Expr
+    child_fields = ('expr',)
 
     def accept(self, visitor):
         visitor.visit_alloc(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, 'alloc', end=' ')
-        self.expr.dump()
-
 
-@dataclass
+@dataclass(slots=True)
 class DirectFieldWrite(Expr):
     name: Id
     field: Id
+    child_fields = ('name', 'field')
 
     def accept(self, visitor):
         visitor.visit_direct_field_write(self)
 
-    def dump(self, indent=0):
-        assert (type(self.name) ==
-                Id), f'DirectFieldWrite: Invalid type {type(self.name)}'
-        assert (type(self.field) ==
-                Id), f'DirectFieldWrite: Invalid type {type(self.field)}'
-        print(' ' * indent, self.name.value, '.', self.field.value, end=' ')
-
 
-@dataclass
+@dataclass(slots=True)
 class IndirectFieldWrite(Expr):
     expr: Expr
     field: Id
+    child_fields = ('expr', 'field')
 
     def accept(self, visitor):
         visitor.visit_indirect_field_write(self)
 
-    def dump(self, indent=0):
-        assert (type(self.field) ==
-                Id), f'IndirectFieldWrite: Invalid type {type(self.field)}'
-        print(' ' * indent, '*', end=' ')
-        self.expr.dump()
-        print('.', self.field.value, end=' ')
-
 
-@dataclass
+@dataclass(slots=True)
 class DerefWrite(Expr):
     expr: Expr
+    child_fields = ('expr',)
 
     def accept(self, visitor):
         visitor.visit_deref_write(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, '*', end=' ')
-        self.expr.dump()
-
 
-@dataclass
+@dataclass(slots=True)
 class Record(Expr):
     fields: list[(Id, Expr)]
+    child_fields = ('fields',)
 
     def accept(self, visitor):
         visitor.visit_record(self)
 
-    def dump(self, indent=0):
-        assert (type(self.fields) ==
-                list), f'Record: Invalid type {type(self.fields)}'
-        print(' ' * indent, '{', end=' ')
-        for field in self.fields:
-            print(' ' * (indent + 2), field[0].value, ':', end=' ')
-            field[1].dump()
-        print(' ' * indent, '}', end=' ')
-
 
-@dataclass
+@dataclass(slots=True)
 class Access(Expr):
     name: Id | Deref | Expr
     fields: list[Id]
+    child_fields = ('name', 'fields')
 
     def accept(self, visitor):
         visitor.visit_access(self)
@@ -228,54 +223,24 @@ class Access(Expr):
             case _: # pragma: no cover
                 raise TypeError('Invalid type for field, want tuple', type(ids))
 
-    def dump(self, indent=0):
-        assert (type(self.name) in (Id, Deref, Expr)
-                ), f'Access: Invalid type {type(self.name)}'
-        assert (type(self.fields) ==
-                list), f'Access: Invalid type {type(self.fields)}'
-        match self.name:
-            case Id(_):
-                self.name.dump()
-            case Deref(expr):
-                print(' ' * indent, '*', end=' ')
-                expr.dump()
-            case _: # pragma: no cover
-                self.name.dump()
-        for field in self.fields:
-            print('.', field.value, end=' ')
 
-
-@dataclass
+@dataclass(slots=True)
 class Parameters(_Ast):
     params: list[Id]
+    child_fields = ('params',)
 
     def accept(self, visitor):
         visitor.visit_parameters(self)
 
-    def dump(self, indent=0):
-        assert (type(self.params) ==
-                list), f'Parameters: Invalid type {type(self.params)}'
-        print(' ' * indent, '(', end=' ')
-        for name in self.params:
-            name.dump()
-        print(')', end=' ')
-
 
-@dataclass
+@dataclass(slots=True)
 class Vardecl(Statement):
     ids: list[Id]
+    child_fields = ('ids',)
 
     def accept(self, visitor):
         visitor.visit_vardecl(self)
 
-    def dump(self, indent=0):
-        assert (type(self.ids) ==
-                list), f'Vardecl: Invalid type {type(self.ids)}'
-        print(' ' * indent, 'var', end=' ')
-        for name in self.ids:
-            name.dump()
-        print(';')
-
     def __init__(self, name: Parameters | Id):
         match name:
             case Parameters(names):
@@ -284,74 +249,52 @@ class Vardecl(Statement):
                 raise TypeError('Invalid type for name', type(name))
 
 
-@dataclass
+@dataclass(slots=True)
 class Return(Statement):
     expr: Expr
+    child_fields = ('expr',)
 
     def accept(self, visitor):
         visitor.visit_return(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, 'return', end=' ')
-        self.expr.dump()
-        print(';')
-
 
-@dataclass
-class Block(_Ast, ast_utils.AsList):
+@dataclass(slots=True)
+class Block(_Ast, _AsList):
     stmts: list[Statement]
+    child_fields = ('stmts',)
 
     def accept(self, visitor):
         visitor.visit_block(self)
 
-    def dump(self, indent=0):
-        assert (type(self.stmts) ==
-                list), f'Block: Invalid type {type(self.stmts)}'
-        print(' ' * indent, '{')
-        for stmt in self.stmts:
-            stmt.dump(indent + 2)
-        print(' ' * indent, '}')
-
 
-@dataclass
+@dataclass(slots=True)
 class FunBlock(Block):
     varstmts: list[Vardecl]
     stmts: list[Statement]
     returnstmt: Return
+    child_fields = ('varstmts', 'stmts', 'returnstmt')
 
     def accept(self, visitor):
         visitor.visit_funblock(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, '{')
-        for varstmt in self.varstmts:
-            varstmt.dump(indent + 2)
-        for stmt in self.stmts:
-            stmt.dump(indent + 2)
-        self.returnstmt.dump(indent + 2)
-        print(' ' * indent, '}')
-
 
-@dataclass
+@dataclass(slots=True)
 class Function(_Ast):
     name: Id
     parameters: Parameters
     body: FunBlock
+    child_fields = ('name', 'parameters', 'body')
 
     def accept(self, visitor):
         visitor.visit_function(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, 'fun', self.name.value, end=' ')
-        self.parameters.dump()
-        self.body.dump(indent + 2)
-
 
-@dataclass
+@dataclass(slots=True)
 class If(Statement):
     cond: Expr
     then: Block
     else_: Block | None
+    child_fields = ('cond', 'then', 'else_')
 
     def __init__(self, cond, then, else_=None):
         self.cond = cond
@@ -361,122 +304,308 @@ class If(Statement):
     def accept(self, visitor):
         visitor.visit_if(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, 'if', end=' ')
-        self.cond.dump()
-        print(' then')
-        self.then.dump(indent + 2)
-        if self.else_:
-            print(' ' * indent, 'else')
-            self.else_.dump(indent + 2)
 
-
-@dataclass
+@dataclass(slots=True)
 class While(Statement):
     cond: Expr
     body: Block
+    child_fields = ('cond', 'body')
 
     def accept(self, visitor):
         visitor.visit_while(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, 'while', end=' ')
-        self.cond.dump()
-        self.body.dump(indent + 2)
-
 
-@dataclass
+@dataclass(slots=True)
 class Assign(Statement):
     name: Id | DirectFieldWrite | IndirectFieldWrite | DerefWrite
     expr: Expr
+    child_fields = ('name', 'expr')
 
     def accept(self, visitor):
         visitor.visit_assign(self)
 
-    def dump(self, indent=0):
-        match self.name:
-            case Id(name):
-                print(' ' * indent, name, '=', end=' ')
-            case DirectFieldWrite(_, _) as dfw:
-                print(' ' * indent, end='')
-                dfw.dump()
-                print('=', end=' ')
-            case IndirectFieldWrite(_, _) as ifw:
-                print(' ' * indent, end='')
-                ifw.dump()
-                print('=', end=' ')
-            case DerefWrite(_) as dw:
-                print(' ' * indent, '*', end='')
-                dw.dump()
-                print('=', end=' ')
-            case _: # pragma: no cover
-                print(type(self.name))
-                print(self.name.__match_args__)
-                print(' ' * indent, '???', end=' ')
-                breakpoint()
-                assert False
-        self.expr.dump()
-        print(';')
-
 
-@dataclass
+@dataclass(slots=True)
 class Input(Expr):
 
     def accept(self, visitor):
         visitor.visit_input(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, 'input', end=' ')
-
 
-@dataclass
+@dataclass(slots=True)
 class Output(Statement):
     expr: Expr
+    child_fields = ('expr',)
 
     def accept(self, visitor):
         visitor.visit_output(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, 'output', end=' ')
-        self.expr.dump()
-        print(';')
-
 
-@dataclass
+@dataclass(slots=True)
 class Call(Expr):
     name: Expr
     args: list[Expr]
+    child_fields = ('name', 'args')
 
     def accept(self, visitor):
         visitor.visit_call(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, end=' ')
-        self.name.dump()
-        print('(', end=' ')
-        for arg in self.args:
-            arg.dump()
-        print(')', end=' ')
-
 
-@dataclass
+@dataclass(slots=True)
 class Error(Statement):
     value: Expr
+    child_fields = ('value',)
 
     def accept(self, visitor):
         visitor.visit_error(self)
 
-    def dump(self, indent=0):
-        print(' ' * indent, 'error', end=' ')
-
 
-@dataclass
+@dataclass(slots=True)
 class Program(_Ast):
     functions: list[Function]
+    child_fields = ('functions',)
 
     def accept(self, visitor):
         visitor.visit_program(self)
 
-    def dump(self, indent=0):
-        for function in self.functions:
-            function.dump(indent)
+    def to_bytes(self) -> bytes:
+        """ serialize to the compact binary format of `tipy.serialize` """
+        from .serialize import dumps
+        return dumps(self)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Program":
+        from .serialize import loads
+        return loads(data)
+
+
+def _children(node) -> list:
+    """
+    The child nodes of a node in source order, `None` for an absent optional
+    child; record fields are flattened to name, value, name, value...
+    """
+    if node is None:
+        return []
+    try:
+        fields = node.child_fields
+    except AttributeError:
+        raise TypeError(f'Not an AST node: {type(node)}') from None
+    children = []
+    for name in fields:
+        value = getattr(node, name)
+        if type(value) is not list:
+            children.append(value)
+        elif value and type(value[0]) is tuple:
+            for pair in value:
+                children.extend(pair)
+        else:
+            children.extend(value)
+    return children
+
+
+def iter_children(node):
+    """
+    Yield the child nodes of a node in source order, like
+    `ast.iter_child_nodes`; absent optional children are skipped, record
+    fields yield their name then their value
+    """
+    for name in node.child_fields:
+        value = getattr(node, name)
+        if type(value) is not list:
+            if value is not None:
+                yield value
+        elif value and type(value[0]) is tuple:
+            for pair in value:
+                yield from pair
+        else:
+            yield from value
+
+
+def walk(node):
+    """
+    Yield a node and every node below it in pre-order, children in source
+    order; unlike `ast.walk` it is depth first, with an explicit stack.
+    The loop inlines the `_WALKERS` kinds; it is faster than `AstWalker`
+    and about as fast as an `AstVisitor` that handles a few node classes
+    """
+    # `_push_children` inlined, with the kinds in locals
+    stack = [node]
+    pop = stack.pop
+    push = stack.append
+    walkers = _WALKERS
+    leaf, one, some, list_ = _LEAF, _ONE, _SOME, _LIST
+    while stack:
+        node = pop()
+        if node is None:
+            continue
+        yield node
+        kind, get = walkers[type(node)]
+        if kind == leaf:
+            continue
+        elif kind == one:
+            push(get(node))
+        elif kind == some:
+            stack += get(node)
+        elif kind == list_:
+            stack += reversed(get(node))
+        else:
+            stack += reversed(_children(node))
+
+
+def _push_children(stack: list, node) -> None:
+    """ push the children of a node on a stack, last to first """
+    kind, get = _WALKERS[type(node)]
+    if kind == _LEAF:
+        return
+    elif kind == _ONE:
+        stack.append(get(node))
+    elif kind == _SOME:
+        stack += get(node)
+    elif kind == _LIST:
+        stack += reversed(get(node))
+    else:
+        stack += reversed(_children(node))
+
+
+# how the children of each node class are pushed on a stack, last to first:
+# none, one node field, a tuple of node fields, one list field, or any mix
+# of them; `None` is pushed for an absent child
+_LEAF, _ONE, _SOME, _LIST, _MIXED = range(5)
+
+
+def _walker(cls) -> tuple[int, Callable | None]:
+    fields = cls.child_fields
+    lists = [name for name in fields
+             if get_origin(cls.__annotations__[name]) is list]
+    if not fields:
+        return _LEAF, None
+    elif not lists:
+        if len(fields) == 1:
+            return _ONE, attrgetter(fields[0])
+        return _SOME, attrgetter(*reversed(fields))
+    elif fields == tuple(lists) and len(fields) == 1 and cls is not Record:
+        return _LIST, attrgetter(fields[0])
+    return _MIXED, None
+
+
+_WALKERS = {
+    cls: _walker(cls)
+    for cls in (Program, Function, Parameters, FunBlock, Block, Vardecl,
+                Return, If, While, Assign, Output, Error, Id, Const,
+                BinaryExpr, UnaryExpr, Reference, Deref, Alloc,
+                DirectFieldWrite, IndirectFieldWrite, DerefWrite, Record,
+                Access, Input, Call)
+}
+
+
+def render(node, indent: int = 0) -> str:
+    """ The text `dump` prints for a node, built without printing """
+    out = []
+    write_source(node, out.append, indent)
+    return ''.join(out)
+
+
+def write_source(node, write: Callable[[str], object], indent: int = 0) -> None:
+    """
+    Pass the text of a node to `write` piece by piece, e.g. `list.append`
+    or the `write` of a text file; nodes are expanded with an explicit
+    stack, so deep trees never hit the recursion limit
+    """
+    # the stack holds text to write and (node, indent) pairs to expand
+    stack = [(node, indent)]
+    pop = stack.pop
+    renderers = _RENDERERS
+    while stack:
+        item = pop()
+        if type(item) is str:
+            write(item)
+            continue
+        node, indent = item
+        if type(node) is Id:
+            write(f'{" " * indent} {node.value} ')
+            continue
+        stack += reversed(renderers[type(node)](node, indent))
+
+
+# the pieces of the text of each node class: text and (node, indent) pairs,
+# spaced as the `print` calls `dump` used to make
+def _render_assign(node: Assign, indent: int) -> list:
+    sp = ' ' * indent
+    match node.name:
+        case Id(name):
+            pieces = [f'{sp} {name} = ']
+        case DirectFieldWrite() | IndirectFieldWrite():
+            pieces = [sp, (node.name, 0), '= ']
+        case DerefWrite():
+            pieces = [f'{sp} *', (node.name, 0), '= ']
+        case _:
+            raise TypeError(f'Invalid assignment to {type(node.name)}')
+    pieces += [(node.expr, 0), ';\n']
+    return pieces
+
+
+def _render_access(node: Access, indent: int) -> list:
+    match node.name:
+        case Deref(expr):
+            pieces = [f'{" " * indent} * ', (expr, 0)]
+        case _:
+            pieces = [(node.name, 0)]
+    pieces += [f'. {field.value} ' for field in node.fields]
+    return pieces
+
+
+def _render_record(node: Record, indent: int) -> list:
+    pieces = [f'{" " * indent} {{ ']
+    for name, value in node.fields:
+        pieces += [f'{" " * (indent + 2)} {name.value} : ', (value, 0)]
+    pieces.append(f'{" " * indent} }} ')
+    return pieces
+
+
+def _render_if(node: If, indent: int) -> list:
+    pieces = [f'{" " * indent} if ', (node.cond, 0), ' then\n',
+              (node.then, indent + 2)]
+    if node.else_ is not None:
+        pieces += [f'{" " * indent} else\n', (node.else_, indent + 2)]
+    return pieces
+
+
+_RENDERERS = {
+    Const: lambda n, i: [f'{" " * i} {n.value} '],
+    BinaryExpr: lambda n, i: [f'{" " * i} {n.op.value} ', (n.left, 0),
+                              (n.right, 0)],
+    UnaryExpr: lambda n, i: [f'{" " * i} {n.op.value} ', (n.expr, 0)],
+    Reference: lambda n, i: [f'{" " * i} & {n.name.value} '],
+    Deref: lambda n, i: [f'{" " * i} * ', (n.expr, 0)],
+    Alloc: lambda n, i: [f'{" " * i} alloc ', (n.expr, 0)],
+    DirectFieldWrite: lambda n, i: [
+        f'{" " * i} {n.name.value} . {n.field.value} '],
+    IndirectFieldWrite: lambda n, i: [f'{" " * i} * ', (n.expr, 0),
+                                      f'. {n.field.value} '],
+    DerefWrite: lambda n, i: [f'{" " * i} * ', (n.expr, 0)],
+    Record: _render_record,
+    Access: _render_access,
+    Parameters: lambda n, i: [f'{" " * i} ( ', *[(p, 0) for p in n.params],
+                              ') '],
+    Vardecl: lambda n, i: [f'{" " * i} var ', *[(v, 0) for v in n.ids],
+                           ';\n'],
+    Return: lambda n, i: [f'{" " * i} return ', (n.expr, 0), ';\n'],
+    Block: lambda n, i: [f'{" " * i} {{\n', *[(s, i + 2) for s in n.stmts],
+                         f'{" " * i} }}\n'],
+    FunBlock: lambda n, i: [f'{" " * i} {{\n',
+                            *[(s, i + 2) for s in n.varstmts],
+                            *[(s, i + 2) for s in n.stmts],
+                            (n.returnstmt, i + 2), f'{" " * i} }}\n'],
+    Function: lambda n, i: [f'{" " * i} fun {n.name.value} ',
+                            (n.parameters, 0), (n.body, i + 2)],
+    If: _render_if,
+    While: lambda n, i: [f'{" " * i} while ', (n.cond, 0), (n.body, i + 2)],
+    Assign: _render_assign,
+    Input: lambda n, i: [f'{" " * i} input '],
+    Output: lambda n, i: [f'{" " * i} output ', (n.expr, 0), ';\n'],
+    Call: lambda n, i: [f'{" " * i} ', (n.name, 0), '( ',
+                        *[(a, 0) for a in n.args], ') '],
+    # the value of an `error` is not shown
+    Error: lambda n, i: [f'{" " * i} error '],
+    Program: lambda n, i: [(f, i) for f in n.functions],
+}
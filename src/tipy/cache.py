@@ -0,0 +1,151 @@
+import glob
+import hashlib
+import os
+import tempfile
+
+from .ast import Program
+from .parser import grammar_digest
+from .serialize import FormatError, VERSION
+from .util import cache_dir
+
+# bump when the AST classes or the entry encoding change
+FORMAT = f'2.{VERSION}'
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed programs in the format of `tipy.serialize`,
+    content-addressed by the hash of the source, the grammar and the format
+    - entries are evicted least recently used first, once the cache holds
+      more than `max_bytes`
+    - `hits` and `misses` count the lookups made through this object
+    - entries that fail to decode are misses and are removed
+
+    The size of the cache is read from the directory once, then kept up to
+    date by `put`; entries written by other processes are counted when the
+    total next goes over `max_bytes` and the directory is scanned to evict.
+    """
+    directory: str
+    max_bytes: int
+    hits: int
+    misses: int
+
+    def __init__(self, directory: str | None = None,
+                 max_bytes: int = 256 * 2**20):
+        self.directory = directory or os.path.join(cache_dir(), 'ast')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = None
+        # the grammar is hashed once, keys copy the hash of the prefix
+        self._seed = hashlib.sha256(f'{FORMAT}:{grammar_digest()}:'.encode())
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, text: str) -> str:
+        digest = self._seed.copy()
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.ast')
+
+    def get(self, key: str) -> Program | None:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            program = Program.from_bytes(data)
+            # the modification time orders entries for eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            # a corrupt entry, FormatError is a ValueError, or one evicted
+            # meanwhile
+            self._discard(path, len(data))
+            self.misses += 1
+            return None
+        self.hits += 1
+        return program
+
+    def put(self, key: str, program: Program) -> None:
+        data = program.to_bytes()
+        # write to a temporary file first, concurrent readers never see
+        # a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:  # pragma: no cover
+                pass
+            raise
+        if self._bytes is None:
+            self._bytes = self.size()
+        else:
+            self._bytes += len(data)
+        if self._bytes > self.max_bytes:
+            # down to 90%, the directory is scanned once every tenth of
+            # the cache written rather than on every put
+            self.evict(self.max_bytes * 9 // 10)
+
+    def _discard(self, path: str, size: int) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        if self._bytes is not None:
+            self._bytes -= size
+
+    def entries(self) -> list[os.DirEntry]:
+        """ entries from the least to the most recently used """
+        entries = [e for e in os.scandir(self.directory)
+                   if e.name.endswith('.ast')]
+        entries.sort(key=lambda e: e.stat().st_mtime_ns)
+        return entries
+
+    def size(self) -> int:
+        return sum(e.stat().st_size for e in self.entries())
+
+    def evict(self, target: int | None = None) -> None:
+        """ remove the least recently used entries until the cache holds
+        at most target bytes, `max_bytes` by default """
+        if target is None:
+            target = self.max_bytes
+        entries = self.entries()
+        total = sum(e.stat().st_size for e in entries)
+        for entry in entries:
+            if total <= target:
+                break
+            total -= entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:  # pragma: no cover
+                pass
+        self._bytes = total
+
+    def clear(self) -> None:
+        for entry in self.entries():
+            os.remove(entry.path)
+        self._bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'bytes': sum(e.stat().st_size for e in entries),
+        }
+
+
+def clear_all() -> None:
+    """ remove every parsed program and compiled grammar tipy has cached """
+    ParseCache().clear()
+    for path in glob.glob(os.path.join(cache_dir(), 'grammar-*.lark')):
+        os.remove(path)
@@ -1,36 +1,50 @@
+import io
+import json
+from array import array
+from dataclasses import dataclass
+from typing import Callable, TextIO
+
 from .ast import *
-from .util import get_output
 
 
 class Node:
+    """ A node of a control flow graph
+
+    index : int
+        Dense ID of the node, its position in `graph.nodes`
+
+    `str(node)` is its label, rendered once and cached
+    """
     graph: "Graph"
+    index: int
     value: Statement | Expr
+    _label: str | None = None
 
     def __init__(self, value: Statement | Expr):
         self.value = value
 
     def pred_nodes(self) -> list["Node"]:
-        for edge in self.graph.edges:
-            if edge.out == self:
-                yield edge.in_
+        for edge in self.graph.preds[self]:
+            yield edge.in_
 
     def succ_nodes(self) -> list["Node"]:
-        for edge in self.graph.edges:
-            if edge.in_ == self:
-                yield edge.out
+        for edge in self.graph.succs[self]:
+            yield edge.out
 
     def pred_edges(self) -> list["Edge"]:
-        for edge in self.graph.edges:
-            if edge.out == self:
-                yield edge
+        yield from self.graph.preds[self]
 
     def succ_edges(self) -> list["Edge"]:
-        for edge in self.graph.edges:
-            if edge.in_ == self:
-                yield edge
+        yield from self.graph.succs[self]
 
     def __str__(self) -> str:
-        return get_output(self.value.dump)
+        label = self._label
+        if label is None:
+            label = self._label = self.label()
+        return label
+
+    def label(self) -> str:
+        return render(self.value)
 
 
 class Nope(Node):
@@ -39,6 +53,49 @@ class Nope(Node):
     def __init__(self):
         pass
 
+    def label(self) -> str:
+        return ''
+
+
+class CallNode(Node):
+    """ The call of an assignment `x = f(...)` in an interprocedural graph
+
+    call : Call
+        The call expression
+    after : AfterCallNode
+        Where the call returns to
+    callee : str | None
+        The name of the function called directly, None for an indirect call
+    caller : str
+        The name of the function of the call
+    """
+    call: Call
+    after: "AfterCallNode"
+    callee: str | None
+    caller: str
+
+    def __init__(self, value: Assign, callee: str | None, caller: str):
+        self.value = value
+        self.call = value.expr
+        self.callee = callee
+        self.caller = caller
+
+    def label(self) -> str:
+        return f'call {render(self.call).strip()}'
+
+
+class AfterCallNode(Node):
+    """ The assignment of the result of a call, after the callee returns
+
+    call : CallNode
+    """
+    call: CallNode
+
+    def __init__(self, value: Assign, call: CallNode):
+        self.value = value
+        self.call = call
+        call.after = self
+
 
 class Condition(Node):
     """ A conditional node """
@@ -47,11 +104,9 @@ class Condition(Node):
 
     def __init__(self, cond: Expr):
         self.cond = cond
-        self._count = True
 
-    def __str__(self) -> str:
-        output = get_output(self.cond.dump)
-        return f'if {output}'
+    def label(self) -> str:
+        return f'if {render(self.cond)}'
 
 
 class Entry(Node):
@@ -69,7 +124,7 @@ class Entry(Node):
         self.name = name
         self.params = params
 
-    def __str__(self) -> str:
+    def label(self) -> str:
         return f'{self.name.value}({", ".join(str(p) for p in self.params)})'
 
 
@@ -83,13 +138,19 @@ class Exit(Node):
     def __init__(self, returnstmt: Return):
         self.returnstmt = returnstmt
 
-    def __str__(self) -> str:
-        return get_output(self.returnstmt.dump)
+    def label(self) -> str:
+        return render(self.returnstmt)
 
 
 class Edge:
+    """ An edge of a control flow graph
+
+    index : int
+        Dense ID of the edge, its position in `graph.edges`
+    """
     in_: Node
     out: Node
+    index: int
 
     def __init__(self, in_: Node, out: Node):
         self.in_ = in_
@@ -113,13 +174,131 @@ class FalseEdge(Edge):
         return 'false'
 
 
+class CallEdge(Edge):
+    """ From a call to the entry of a callee """
+
+    def __str__(self) -> str:
+        return 'call'
+
+
+class ReturnEdge(Edge):
+    """ From the exit of a callee to where a call returns """
+
+    def __str__(self) -> str:
+        return 'return'
+
+
+class LocalEdge(Edge):
+    """ From a call to where it returns, within the caller: the locals of
+    the caller flow around the call, whether it is resolved or not """
+
+    def __str__(self) -> str:
+        return 'local'
+
+
+# kinds of edges in `CSR.kinds`
+EDGE, TRUE, FALSE, CALL, RETURN, LOCAL = range(6)
+
+
+@dataclass(frozen=True, slots=True)
+class CSR:
+    """ Compressed sparse row view of the edges of a `Graph`
+
+    The edges leaving node i, or entering it for a reversed view, are the
+    slots offsets[i] to offsets[i + 1]: the other end of edge k is node
+    targets[k], its kind kinds[k] (`EDGE`, `TRUE`, `FALSE`, `CALL`,
+    `RETURN` or `LOCAL`) and its ID edges[k]. Edges keep the order of `Graph.succs` (`Graph.preds`).
+    """
+    offsets: array
+    targets: array
+    kinds: array
+    edges: array
+
+    def neighbours(self, i: int) -> array:
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def to_numpy(self) -> tuple:
+        """ (offsets, targets, kinds, edges) as NumPy arrays sharing the
+        memory of the view, needs NumPy """
+        import numpy
+        return tuple(numpy.frombuffer(a, dtype=a.typecode)
+                     for a in (self.offsets, self.targets, self.kinds,
+                               self.edges))
+
+
+_EDGE_KINDS = {Edge: EDGE, TrueEdge: TRUE, FalseEdge: FALSE,
+               CallEdge: CALL, ReturnEdge: RETURN, LocalEdge: LOCAL}
+
+
+def _dot_string(text: str) -> str:
+    """ a quoted DOT string, lines are left justified """
+    text = text.replace('\\', '\\\\').replace('"', '\\"')
+    return '"' + text.replace('\n', '\\l') + '"'
+
+
+def postorder(csr: CSR, roots: list[int]) -> list[int]:
+    """ the nodes reachable from the roots in depth first postorder,
+    successors in order, without recursion """
+    offsets, targets = csr.offsets, csr.targets
+    seen = bytearray(len(offsets) - 1)
+    order = []
+    for root in roots:
+        if seen[root]:
+            continue
+        seen[root] = 1
+        # (node, next successor slot)
+        stack = [(root, offsets[root])]
+        while stack:
+            node, k = stack[-1]
+            if k < offsets[node + 1]:
+                stack[-1] = (node, k + 1)
+                succ = targets[k]
+                if not seen[succ]:
+                    seen[succ] = 1
+                    stack.append((succ, offsets[succ]))
+            else:
+                stack.pop()
+                order.append(node)
+    return order
+
+
 class Graph:
-    nodes: list[Node]
-    edges: list[Edge]
+    """ A control flow graph
+
+    nodes : list[Node]
+    edges : list[Edge]
+    preds, succs : dict[Node, list[Edge]]
+        The incoming and outgoing edges of each node, in the order they
+        were added, kept up to date by `add_edge` and `remove_edge`
+    entry, exit : Entry | None, Exit | None
+        The entry and exit of the function of a graph built by
+        `build_func`, None for the graph of a whole program
+
+    Nodes and edges are numbered densely by their position, so facts about
+    them can be kept in lists or arrays; `csr()` is a frozen view of the
+    edges in terms of these numbers. Views are cached until the graph
+    changes. A removal leaves a hole, the other numbers are unchanged; the
+    holes are closed and everything renumbered once, the next time `nodes`
+    or `edges` is read, so removing many nodes or edges is linear.
+    """
+    preds: dict[Node, list[Edge]]
+    succs: dict[Node, list[Edge]]
+    entry: Entry | None
+    exit: Exit | None
 
     def __init__(self, nodes: list[Node], edges: list[Edge]) -> None:
-        self.nodes = nodes
-        self.edges = edges
+        self._nodes = []
+        self._edges = []
+        self._holes = 0
+        self.preds = {}
+        self.succs = {}
+        self.entry = None
+        self.exit = None
+        self._cache = {}
+        for node in nodes:
+            self.add_node(node)
+        for edge in edges:
+            self._add_edge(edge)
 
     @classmethod
     def build_prog(cls, ast: Program) -> "Graph":
@@ -129,8 +308,16 @@ class Graph:
             cfg.build_function(function)
         return cfg
 
-    def build_function(self, ast: Function) -> None:
-        """ Build a control flow graph from a function"""
+    @classmethod
+    def build_func(cls, ast: Function) -> "Graph":
+        """ Build the control flow graph of a single function """
+        cfg = cls([], [])
+        cfg.entry, cfg.exit = cfg.build_function(ast)
+        return cfg
+
+    def build_function(self, ast: Function) -> tuple[Entry, Exit]:
+        """ Build a control flow graph from a function, add it to the graph
+        and return its entry and exit nodes """
         # build entry and exit node
         function_entry = Entry(ast.name, ast.parameters.params)
         function_exit = Exit(ast.body.returnstmt)
@@ -138,118 +325,549 @@ class Graph:
         self.add_node(function_exit)
 
         stmts = ast.body.varstmts + ast.body.stmts
-        exit = self.build_stmts(stmts, function_entry)
-        self.add_edge(exit, function_exit)
-        self.eliminate_nope()
+        exits = self.build_stmts(stmts, function_entry)
+        self.connect(exits, function_exit)
+        return function_entry, function_exit
 
-    def build_stmts(self, stmts: list[Statement], entry: Node) -> Node:
+    def build_stmts(self, stmts: list[Statement],
+                    entry: Node) -> list[tuple[Node, bool | None]]:
         """ Build a control flow graph from a list of statements
         - get the entry node of the statement
-        - return the exit node of the statement
+        - return the exits of the statement, the edges still to connect to
+          whatever follows as (node, flag) pairs, see `add_edge`
+
+        Branches are merged by connecting the exits of both to the next
+        node, so no `Nope` node is created. Nested statements are built with
+        an explicit stack of frames (statements left, kind, data): the
+        statements of a block, the then or else branch of an `if`, or the
+        body of a `while`; `current` is the exits of the statements built
+        so far
         """
-        # stmts is null, then add an edge from entry to exit
-        if len(stmts) == 0:
-            return entry
-        else:
-            entry_inter = entry
-            for stmt in stmts:
-                entry_inter = self.build_stmt(stmt, entry_inter)
-            return entry_inter
-
-    def build_stmt(self, stmt: Statement, entry: Node) -> Node:
+        current = [(entry, None)]
+        frames = [(iter(stmts), None, None)]
+        while frames:
+            stmts, kind, data = frames[-1]
+            stmt = next(stmts, None)
+            if stmt is None:
+                frames.pop()
+                match kind:
+                    case 'then':
+                        cond_node, false_block = data
+                        if false_block is None:
+                            current.append((cond_node, False))
+                        else:
+                            frames.append((iter((false_block,)), 'else',
+                                           current))
+                            current = [(cond_node, False)]
+                    case 'else':
+                        current = data + current
+                    case 'while':
+                        # loop back to the condition
+                        self.connect(current, data)
+                        current = [(data, False)]
+                continue
+
+            match stmt:
+                case Block(stmts):
+                    frames.append((iter(stmts), None, None))
+
+                case If(cond, true_block, false_block):
+                    cond_node = Condition(cond)
+                    self.add_node(cond_node)
+                    self.connect(current, cond_node)
+                    frames.append((iter((true_block,)), 'then',
+                                   (cond_node, false_block)))
+                    current = [(cond_node, True)]
+
+                case While(cond, block):
+                    cond_node = Condition(cond)
+                    self.add_node(cond_node)
+                    self.connect(current, cond_node)
+                    frames.append((iter((block,)), 'while', cond_node))
+                    current = [(cond_node, True)]
+
+                case _:
+                    current = self.build_simple(stmt, current)
+        return current
+
+    def build_simple(self, stmt: Statement,
+                     exits: list[tuple[Node, bool | None]]
+                     ) -> list[tuple[Node, bool | None]]:
+        """ Build a statement without nested statements after exits """
+        node = Node(stmt)
+        self.add_node(node)
+        self.connect(exits, node)
+        return [(node, None)]
+
+    def build_stmt(self, stmt: Statement,
+                   entry: Node) -> list[tuple[Node, bool | None]]:
         """ Build a control flow graph from a statement
         - get the entry node of the statement
-        - return the exit node of the statement
-        """
-        match stmt:
-            case Block(stmts):
-                return self.build_stmts(stmts, entry)
-
-            case If(cond, true_block, false_block):
-                cond_node = Condition(cond)
-                self.add_node(cond_node)
-                self.add_edge(entry, cond_node)
-                true_exit = self.build_stmts(
-                    true_block.stmts, cond_node)
-                merge = Nope()
-                self.add_node(merge)
-                self.add_edge(true_exit, merge)
-                if false_block is None:
-                    self.add_edge(cond_node, merge, False)
-                else:
-                    false_exit = self.build_stmts(
-                        false_block.stmts, cond_node)
-                    self.add_edge(false_exit, merge)
-                return merge
-
-            case While(cond, block):
-                cond_node = Condition(cond)
-                self.add_node(cond_node)
-                self.add_edge(entry, cond_node)
-                merge = Nope()
-                self.add_node(merge)
-                exit = self.build_stmts(block.stmts, cond_node)
-                self.add_edge(cond_node, merge, False)
-                # loop back to the condition
-                self.add_edge(exit, cond_node)
-                return merge
-
-            case _:
-                node = Node(stmt)
-                self.add_node(node)
-                self.add_edge(entry, node)
-                return node
+        - return the exits of the statement
+        """
+        return self.build_stmts([stmt], entry)
+
+    def connect(self, exits: list[tuple[Node, bool | None]],
+                node: Node) -> None:
+        """ add an edge from each of the exits to node """
+        for in_, flag in exits:
+            self.add_edge(in_, node, flag)
 
     def add_node(self, node: Node) -> None:
-        if node in self.nodes:  # pragma: no cover
+        if node in self.succs:  # pragma: no cover
             print(f'Warning: node {node} already in graph')
-        self.nodes.append(node)
+        node.index = len(self._nodes)
+        self._nodes.append(node)
+        self.preds[node] = []
+        self.succs[node] = []
         node.graph = self
+        self._cache.clear()
 
     def add_edge(self, in_: Node, out: Node, flag: bool = None) -> None:
-        # dirty hack to make edge work with condition
-        if isinstance(in_, Condition):
-            if in_._count:
-                in_._count = False
-                flag = True
-            else:
-                flag = False
+        """ add an `Edge`, a `TrueEdge` or a `FalseEdge` as flag is None,
+        true or false """
         if flag is None:
             edge = Edge(in_, out)
         elif flag:
             edge = TrueEdge(in_, out)
         else:
             edge = FalseEdge(in_, out)
+        self._add_edge(edge)
 
-        if edge in self.edges:  # pragma: no cover
-            print(f'Warning: edge {edge} already in graph')
-        self.edges.append(edge)
+    def _add_edge(self, edge: Edge) -> None:
+        edge.index = len(self._edges)
+        self._edges.append(edge)
+        self.succs[edge.in_].append(edge)
+        self.preds[edge.out].append(edge)
         edge.graph = self
+        self._cache.clear()
+
+    @property
+    def nodes(self) -> list[Node]:
+        if self._holes:
+            self._compact()
+        return self._nodes
+
+    @property
+    def edges(self) -> list[Edge]:
+        if self._holes:
+            self._compact()
+        return self._edges
+
+    def remove_edge(self, edge: Edge) -> None:
+        self._edges[edge.index] = None
+        self._holes += 1
+        self.succs[edge.in_].remove(edge)
+        self.preds[edge.out].remove(edge)
+        self._cache.clear()
+
+    def remove_node(self, node: Node) -> None:
+        """ remove a node and its edges """
+        for edge in self.preds[node][:]:
+            self.remove_edge(edge)
+        for edge in self.succs[node][:]:
+            self.remove_edge(edge)
+        self._nodes[node.index] = None
+        self._holes += 1
+        del self.preds[node]
+        del self.succs[node]
+        self._cache.clear()
+
+    def _compact(self) -> None:
+        """ close the holes left by removals and renumber """
+        self._nodes = [node for node in self._nodes if node is not None]
+        self._edges = [edge for edge in self._edges if edge is not None]
+        for items in (self._nodes, self._edges):
+            for i, item in enumerate(items):
+                item.index = i
+        self._holes = 0
+        self._cache.clear()
 
     def eliminate_nope(self) -> None:
+        """
+        Remove the `Nope` nodes of a graph built by hand, connecting their
+        predecessors to their successors with edges of the same kind as the
+        incoming ones. The graph builders never create a `Nope`.
+
+        A single pass, only the neighbours of each `Nope` are updated on
+        the way; the lists of nodes and edges are compacted once after it
+        """
         for node in self.nodes:
-            if isinstance(node, Nope):
-                remove_nodes = []
-                remove_edges = []
-                remove_nodes.append(node)
-                # for each pred edge, add an edge from pred to each succ
-                for edge in node.pred_edges():
-                    remove_edges.append(edge)
-                    for succ_edge in node.succ_edges():
-                        remove_edges.append(succ_edge)
-                        self.add_edge(edge.in_, succ_edge.out)
-                for node in remove_nodes:
-                    if node in self.nodes:
-                        self.nodes.remove(node)
-                for edge in remove_edges:
-                    if edge in self.edges:
-                        self.edges.remove(edge)
+            if not isinstance(node, Nope):
+                continue
+            preds = [e for e in self.preds[node] if e.in_ is not node]
+            succs = [e for e in self.succs[node] if e.out is not node]
+            for edge in preds:
+                for succ_edge in succs:
+                    self._add_edge(type(edge)(edge.in_, succ_edge.out))
+            self.remove_node(node)
+
+    def cached(self, key, compute: Callable[[], object]):
+        """ compute() the first time, the same value until the graph changes """
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = compute()
+        return value
+
+    def csr(self, reverse: bool = False) -> CSR:
+        """ the successors of every node, or its predecessors if reverse """
+        return self.cached(('csr', reverse), lambda: self._csr(reverse))
+
+    def roots(self) -> list[int]:
+        """ the entry of each function, the first node of a graph without
+        entries """
+        entries = [node.index for node in self.nodes
+                   if isinstance(node, Entry)]
+        return entries or [0] if self.nodes else []
+
+    def postorder(self) -> list[int]:
+        """
+        The nodes reachable from the roots in depth first postorder, one
+        function after the other, each node once even if several functions
+        reach it; the order backward analyses converge fastest in
+        """
+        return self.cached('postorder', lambda: postorder(
+            self.csr(), self.roots()))
 
-    def visualize(self, filename: str = 'cfg'):  # pragma: no cover
-        import graphviz
-        dot = graphviz.Digraph()
+    def rpo(self) -> list[int]:
+        """
+        The nodes reachable from the roots in reverse postorder, one
+        function after the other: a node comes before its successors but
+        for back edges, the order forward analyses converge fastest in
+        """
+        # the last root is searched first, so that the first comes first
+        return self.cached('rpo', lambda: postorder(
+            self.csr(), self.roots()[::-1])[::-1])
+
+    def sccs(self) -> list[list[int]]:
+        """
+        The strongly connected components in topological order: edges
+        between components go forward, unreachable ones included. The
+        functions come function by function, first function first, and
+        unreachable nodes after them; only unreachable nodes reaching an
+        entry come before it, and nodes they reach may then be out of their
+        function. The nodes of a component are in reverse postorder.
+        """
+        return self.cached('sccs', self._sccs)
+
+    def _sccs(self) -> list[list[int]]:
+        """ Tarjan's algorithm with an explicit stack of (node, next
+        successor slot) """
+        csr = self.csr()
+        offsets, targets = csr.offsets, csr.targets
+        count = len(self.nodes)
+        number = [count] * count
+        for i, node in enumerate(self.rpo()):
+            number[node] = i
+        index = [-1] * count
+        low = [0] * count
+        on_stack = bytearray(count)
+        stack = []
+        counter = 0
+        result = []
+        # Tarjan finds a component after those it reaches, so one pass
+        # reversed is in topological order. A search started later comes
+        # earlier: the unreachable nodes first, those reaching a root last,
+        # then the roots, last first
+        roots = self.roots()
+        starts = [node for node in range(count - 1, -1, -1)
+                  if number[node] == count]
+        if starts:
+            reaching = bytearray(count)
+            for node in postorder(self.csr(True), roots):
+                reaching[node] = 1
+            starts.sort(key=reaching.__getitem__)
+        starts += roots[::-1]
+        for root in starts:
+            if index[root] >= 0:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, offsets[root])]
+            while work:
+                node, k = work[-1]
+                if k < offsets[node + 1]:
+                    work[-1] = (node, k + 1)
+                    succ = targets[k]
+                    if index[succ] < 0:
+                        index[succ] = low[succ] = counter
+                        counter += 1
+                        stack.append(succ)
+                        on_stack[succ] = 1
+                        work.append((succ, offsets[succ]))
+                    elif on_stack[succ] and index[succ] < low[node]:
+                        low[node] = index[succ]
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    component.sort(key=number.__getitem__)
+                    result.append(component)
+        result.reverse()
+        return result
+
+    def _csr(self, reverse: bool) -> CSR:
+        adjacency = self.preds if reverse else self.succs
+        offsets = array('l', [0])
+        targets = array('l')
+        kinds = array('b')
+        edges = array('l')
         for node in self.nodes:
-            dot.node(str(id(node)), str(node))
+            for edge in adjacency[node]:
+                targets.append((edge.in_ if reverse else edge.out).index)
+                kinds.append(_EDGE_KINDS[type(edge)])
+                edges.append(edge.index)
+            offsets.append(len(targets))
+        return CSR(offsets, targets, kinds, edges)
+
+    def functions(self):
+        """
+        (entry, first, end) of each function: the nodes of a function built
+        by `build_function` are `nodes[first:end]`, its entry first
+        """
+        entries = [node.index for node in self.nodes
+                   if isinstance(node, Entry)]
+        for i, first in enumerate(entries):
+            end = entries[i + 1] if i + 1 < len(entries) else len(self.nodes)
+            yield self.nodes[first], first, end
+
+    def write_dot(self, fp: TextIO, clusters: bool = True,
+                  name: str = 'cfg') -> None:
+        """
+        Write the graph to a text file in the DOT language of graphviz, one
+        line at a time; node n{i} is `nodes[i]`. Each function is a
+        subgraph cluster unless clusters is false.
+        """
+        write = fp.write
+        nodes = self.nodes
+        write(f'digraph {name} {{\n')
+        if clusters:
+            spans = [(str(entry.name), first, end)
+                     for entry, first, end in self.functions()]
+        else:
+            spans = []
+        first = spans[0][1] if spans else len(nodes)
+        # nodes outside of any function, e.g. in graphs built by hand
+        for i in range(first):
+            write(f'  n{i} [label={_dot_string(str(nodes[i]))}];\n')
+        for k, (function, first, end) in enumerate(spans):
+            write(f'  subgraph cluster_{k} {{\n'
+                  f'    label={_dot_string(function)};\n')
+            for i in range(first, end):
+                write(f'    n{i} [label={_dot_string(str(nodes[i]))}];\n')
+            write('  }\n')
         for edge in self.edges:
-            dot.edge(str(id(edge.in_)), str(id(edge.out)), label=str(edge))
-        dot.render(filename, view=True)
+            label = str(edge)
+            attributes = f' [label="{label}"]' if label else ''
+            write(f'  n{edge.in_.index} -> n{edge.out.index}{attributes};\n')
+        write('}\n')
+
+    def write_json(self, fp: TextIO) -> None:
+        """
+        Write the graph to a text file as JSON, one node or edge per line:
+        {"nodes": [{"id", "kind", "label", "function"}],
+         "edges": [{"id", "source", "target", "kind"}]}
+        ids are the indices of the nodes and edges, "function" is the name
+        of the function of a node, null outside of any function; the kind
+        of an edge is "", "true" or "false", and in an `ICFG` also "call",
+        "return" or "local"
+        """
+        write = fp.write
+        dumps = json.dumps
+        functions = [None] * len(self.nodes)
+        for entry, first, end in self.functions():
+            functions[first:end] = [str(entry.name)] * (end - first)
+        write('{"nodes": [')
+        separator = '\n'
+        for node in self.nodes:
+            write(f'{separator}{{"id": {node.index}, '
+                  f'"kind": "{type(node).__name__}", '
+                  f'"label": {dumps(str(node))}, '
+                  f'"function": {dumps(functions[node.index])}}}')
+            separator = ',\n'
+        write('\n], "edges": [')
+        separator = '\n'
+        for edge in self.edges:
+            write(f'{separator}{{"id": {edge.index}, '
+                  f'"source": {edge.in_.index}, "target": {edge.out.index}, '
+                  f'"kind": "{edge}"}}')
+            separator = ',\n'
+        write('\n]}\n')
+
+    def visualize(self, filename: str = 'cfg'):  # pragma: no cover
+        """ render the graph with the graphviz package and show it """
+        import graphviz
+        dot = io.StringIO()
+        self.write_dot(dot)
+        graphviz.Source(dot.getvalue()).render(filename, view=True)
+
+
+class ProgramCFG:
+    """ The control flow graphs of the functions of a program, by name
+
+    The graph of a function is built on first access and cached, so
+    analysing one function of a big program does not build the others
+
+    >>> from .parser import parse
+    >>> cfg = ProgramCFG(parse("f() { return 1; } g() { return 2; }"))
+    >>> graph = cfg['g']
+    >>> str(graph.entry), len(graph.nodes), list(cfg.built())
+    ('g()', 2, ['g'])
+    """
+    program: Program
+    functions: dict[str, Function]
+
+    def __init__(self, program: Program):
+        self.program = program
+        self.functions = {}
+        for function in program.functions:
+            self.functions.setdefault(function.name.value, function)
+        self._graphs = {}
+
+    def __getitem__(self, name: str) -> Graph:
+        graph = self._graphs.get(name)
+        if graph is None:
+            graph = self._graphs[name] = Graph.build_func(self.functions[name])
+        return graph
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.functions
+
+    def __iter__(self):
+        return iter(self.functions)
+
+    def __len__(self) -> int:
+        return len(self.functions)
+
+    def items(self):
+        """ (name, graph) of every function, building the graphs """
+        for name in self.functions:
+            yield name, self[name]
+
+    def built(self):
+        """ the names of the functions whose graph is built """
+        return iter(self._graphs)
+
+
+def arity_call_graph(call: CallNode, icfg: "ICFG") -> list[str]:
+    """ the functions an indirect call may reach: those taking as many
+    arguments as it passes """
+    return [name for name, function in icfg.definitions.items()
+            if len(function.parameters.params) == len(call.call.args)]
+
+
+class ICFG(Graph):
+    """ An interprocedural control flow graph
+
+    The functions of a program in one graph, every assignment of a call
+    `x = f(...)` is split into a `CallNode` and an `AfterCallNode`. A direct
+    call, to a function by name, has a `CallEdge` to the entry of the callee
+    and a `ReturnEdge` from its exit to the after-call node; every call has
+    a `LocalEdge` to its after-call node, so the rest of the caller stays
+    reachable before its callees are known. Indirect calls
+    are resolved on demand by `callees()` through `call_graph`, a function
+    of the call node and the graph returning the names of the callees,
+    `arity_call_graph` by default. Calls nested in other expressions are
+    ordinary nodes, normalize the program to analyse them.
+
+    procedures : dict[str, tuple[Entry, Exit]]
+        The entry and exit of each function
+    definitions : dict[str, Function]
+        The functions of the program
+    calls : list[CallNode]
+        Every call node, in program order
+    """
+    procedures: dict[str, tuple[Entry, Exit]]
+    definitions: dict[str, Function]
+    calls: list[CallNode]
+    call_graph: Callable[[CallNode, "ICFG"], list[str]]
+
+    def __init__(self, nodes: list[Node], edges: list[Edge]) -> None:
+        super().__init__(nodes, edges)
+        self.procedures = {}
+        self.definitions = {}
+        self.calls = []
+        self.call_graph = arity_call_graph
+        self._resolved = {}
+        self._locals = set()
+        self._caller = None
+
+    @classmethod
+    def build_prog(cls, ast: Program,
+                   call_graph: Callable[[CallNode, "ICFG"], list[str]]
+                   = None) -> "ICFG":
+        """ Build the graph in one pass over the program, then link the
+        direct calls """
+        icfg = cls([], [])
+        if call_graph is not None:
+            icfg.call_graph = call_graph
+        for function in ast.functions:
+            icfg.definitions.setdefault(function.name.value, function)
+        for function in ast.functions:
+            entry_exit = icfg.build_function(function)
+            icfg.procedures.setdefault(function.name.value, entry_exit)
+        for call in icfg.calls:
+            if call.callee is not None:
+                icfg.link(call, call.callee)
+                icfg._resolved[call] = [call.callee]
+        return icfg
+
+    def build_function(self, ast: Function) -> tuple[Entry, Exit]:
+        # a local or a parameter named like a function hides it
+        self._caller = ast.name.value
+        self._locals = {param.value for param in ast.parameters.params}
+        for vardecl in ast.body.varstmts:
+            self._locals.update(name.value for name in vardecl.ids)
+        return super().build_function(ast)
+
+    def build_simple(self, stmt: Statement,
+                     exits: list[tuple[Node, bool | None]]
+                     ) -> list[tuple[Node, bool | None]]:
+        if type(stmt) is not Assign or type(stmt.expr) is not Call:
+            return super().build_simple(stmt, exits)
+        name = stmt.expr.name
+        direct = (type(name) is Id and name.value in self.definitions
+                  and name.value not in self._locals)
+        call = CallNode(stmt, name.value if direct else None, self._caller)
+        after = AfterCallNode(stmt, call)
+        self.add_node(call)
+        self.add_node(after)
+        self.connect(exits, call)
+        self._add_edge(LocalEdge(call, after))
+        self.calls.append(call)
+        return [(after, None)]
+
+    def link(self, call: CallNode, callee: str) -> None:
+        """ add the call and return edges between a call and a function """
+        entry, exit = self.procedures[callee]
+        self._add_edge(CallEdge(call, entry))
+        self._add_edge(ReturnEdge(exit, call.after))
+
+    def callees(self, call: CallNode) -> list[str]:
+        """ the names of the functions a call may reach, resolving an
+        indirect call through `call_graph` the first time """
+        callees = self._resolved.get(call)
+        if callees is None:
+            callees = self._resolved[call] = [
+                name for name in self.call_graph(call, self)
+                if name in self.procedures]
+            for name in callees:
+                self.link(call, name)
+        return callees
+
+    def resolve(self) -> None:
+        """ resolve every indirect call """
+        for call in self.calls:
+            self.callees(call)
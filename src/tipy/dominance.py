@@ -0,0 +1,319 @@
+""" Dominance in control flow graphs
+
+A node d dominates n if every path from the entry of the function to n goes
+through d, and post-dominates n if every path from n to the exit does.
+Immediate dominators are computed with the iterative algorithm of Cooper,
+Harvey and Kennedy ("A Simple, Fast Dominance Algorithm") over the CSR view
+of the graph, nodes are the dense IDs of `tipy.cfg`.
+
+Natural loops are found from back edges, edges to a dominator of their
+source, and nested into a forest. The graphs built from TIP programs are
+reducible, so every cycle is a natural loop.
+"""
+
+from dataclasses import dataclass, field
+
+from .ast import Function
+from .cfg import CSR, Exit, Graph, Node, postorder
+
+
+class DominatorTree:
+    """ The dominator tree, or post-dominator tree, of a graph
+
+    idom : list[int]
+        The immediate dominator of each node, the node itself for a root
+        (an entry, or an exit for post-dominators, or a node reached from
+        several of them and dominated by none), -1 if unreachable
+    children : list[list[int]]
+        The nodes each node immediately dominates
+    """
+    idom: list[int]
+    children: list[list[int]]
+
+    def __init__(self, csr: CSR, reverse: CSR, roots: list[int]):
+        self._reverse = reverse
+        self.idom = _immediate_dominators(csr, reverse, roots)
+        self.children = [[] for _ in self.idom]
+        for node, parent in enumerate(self.idom):
+            if parent != node and parent >= 0:
+                self.children[parent].append(node)
+        # preorder intervals of the tree: a dominates b iff
+        # enter[a] <= enter[b] and leave[b] <= leave[a]
+        count = len(self.idom)
+        self._enter = [-1] * count
+        self._leave = [-1] * count
+        clock = 0
+        for root, parent in enumerate(self.idom):
+            if parent != root:
+                continue
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                if node < 0:
+                    self._leave[~node] = clock
+                    continue
+                self._enter[node] = clock
+                clock += 1
+                stack.append(~node)
+                stack += reversed(self.children[node])
+        self._frontiers = None
+
+    def dominates(self, a: int, b: int) -> bool:
+        """ whether a dominates b, every reachable node dominates itself """
+        enter = self._enter
+        return (enter[a] >= 0 and enter[b] >= 0 and enter[a] <= enter[b]
+                and self._leave[b] <= self._leave[a])
+
+    def strictly_dominates(self, a: int, b: int) -> bool:
+        return a != b and self.dominates(a, b)
+
+    def frontiers(self) -> list[list[int]]:
+        """ the dominance frontier of each node: the nodes where its
+        dominance ends, a merge point with a path around it """
+        if self._frontiers is None:
+            idom = self.idom
+            frontiers = [[] for _ in idom]
+            preds = self._reverse
+            offsets, targets = preds.offsets, preds.targets
+            for node, parent in enumerate(idom):
+                if parent < 0:
+                    continue
+                # a root joins its predecessors with a path from the virtual
+                # root over all roots, it is in the frontier of the nodes it
+                # is reached from up to their roots, itself included
+                joins = 2
+                if parent == node:
+                    parent, joins = -1, 1
+                if offsets[node + 1] - offsets[node] < joins:
+                    continue
+                for k in range(offsets[node], offsets[node + 1]):
+                    runner = targets[k]
+                    if idom[runner] < 0:
+                        continue
+                    while runner != parent:
+                        runners = frontiers[runner]
+                        if not runners or runners[-1] != node:
+                            runners.append(node)
+                        if idom[runner] == runner:
+                            break
+                        runner = idom[runner]
+            self._frontiers = frontiers
+        return self._frontiers
+
+
+def _immediate_dominators(csr: CSR, reverse: CSR,
+                          roots: list[int]) -> list[int]:
+    """ Cooper-Harvey-Kennedy: iterate in reverse postorder until the
+    immediate dominators stop changing
+
+    The roots hang off a virtual root, numbered `count` and last in
+    postorder, so that intersecting nodes of different trees ends there;
+    the nodes it immediately dominates become roots of their own.
+    """
+    count = len(csr.offsets) - 1
+    order = postorder(csr, roots)
+    number = [-1] * (count + 1)
+    for i, node in enumerate(order):
+        number[node] = i
+    number[count] = len(order)
+    idom = [-1] * (count + 1)
+    idom[count] = count
+    for root in roots:
+        idom[root] = count
+    offsets, preds = reverse.offsets, reverse.targets
+    rpo = [node for node in reversed(order) if idom[node] != count]
+    changed = True
+    while changed:
+        changed = False
+        for node in rpo:
+            new = -1
+            for k in range(offsets[node], offsets[node + 1]):
+                pred = preds[k]
+                if idom[pred] < 0:
+                    continue
+                if new < 0:
+                    new = pred
+                    continue
+                # intersect: climb from the lower postorder number
+                a, b = pred, new
+                while a != b:
+                    while number[a] < number[b]:
+                        a = idom[a]
+                    while number[b] < number[a]:
+                        b = idom[b]
+                new = a
+            if idom[node] != new:
+                idom[node] = new
+                changed = True
+    idom.pop()
+    for node, parent in enumerate(idom):
+        if parent == count:
+            idom[node] = node
+    return idom
+
+
+@dataclass(eq=False, slots=True)
+class Loop:
+    """ A natural loop
+
+    header : int
+        The node every edge into the loop enters by, it dominates the loop
+    latches : list[int]
+        The sources of the back edges to the header
+    body : list[int]
+        The nodes of the loop outside of its nested loops, header first
+    """
+    header: int
+    latches: list[int]
+    body: list[int]
+    parent: "Loop | None" = None
+    children: list["Loop"] = field(default_factory=list)
+
+    def nodes(self) -> list[int]:
+        """ the nodes of the loop and of its nested loops """
+        nodes = []
+        stack = [self]
+        while stack:
+            loop = stack.pop()
+            nodes += loop.body
+            stack += loop.children
+        return nodes
+
+    @property
+    def depth(self) -> int:
+        depth, loop = 1, self.parent
+        while loop is not None:
+            depth, loop = depth + 1, loop.parent
+        return depth
+
+
+class Dominance:
+    """ Dominators, post-dominators and loops of a control flow graph
+
+    tree : DominatorTree
+        Rooted at the entry of each function
+    post : DominatorTree
+        Rooted at the exit of each function, on the reversed graph
+    loops : list[Loop]
+        The outermost loops, the roots of the loop nesting forest
+    loop_of : list[Loop | None]
+        The innermost loop of each node
+    """
+    graph: Graph
+    tree: DominatorTree
+    post: DominatorTree
+    loops: list[Loop]
+    loop_of: list[Loop | None]
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        csr, reverse = graph.csr(), graph.csr(reverse=True)
+        nodes = graph.nodes
+        entries = graph.roots()
+        exits = [n.index for n in nodes if isinstance(n, Exit)]
+        # graphs built by hand: the nodes without successors
+        if not exits:
+            exits = [i for i in range(len(nodes))
+                     if csr.offsets[i] == csr.offsets[i + 1]]
+        self.tree = DominatorTree(csr, reverse, entries)
+        self.post = DominatorTree(reverse, csr, exits)
+        self._find_loops(reverse)
+
+    @property
+    def idom(self) -> list[int]:
+        return self.tree.idom
+
+    @property
+    def ipdom(self) -> list[int]:
+        return self.post.idom
+
+    def frontiers(self) -> list[list[int]]:
+        return self.tree.frontiers()
+
+    def dominates(self, a: Node, b: Node) -> bool:
+        return self.tree.dominates(a.index, b.index)
+
+    def post_dominates(self, a: Node, b: Node) -> bool:
+        return self.post.dominates(a.index, b.index)
+
+    def immediate_dominator(self, node: Node) -> Node | None:
+        """ None for an entry or an unreachable node """
+        parent = self.tree.idom[node.index]
+        return None if parent in (-1, node.index) else self.graph.nodes[parent]
+
+    def immediate_post_dominator(self, node: Node) -> Node | None:
+        parent = self.post.idom[node.index]
+        return None if parent in (-1, node.index) else self.graph.nodes[parent]
+
+    def _find_loops(self, reverse: CSR) -> None:
+        """
+        Tarjan's loop nesting: headers are visited from the innermost, the
+        last in a preorder of the dominator tree, and a loop found is
+        collapsed into its header with union-find, so enclosing loops walk
+        each node once
+        """
+        tree = self.tree
+        idom = tree.idom
+        offsets, preds = reverse.offsets, reverse.targets
+        latches = {}
+        for node in range(len(idom)):
+            for k in range(offsets[node], offsets[node + 1]):
+                if tree.dominates(node, preds[k]):
+                    latches.setdefault(node, []).append(preds[k])
+        rep = list(range(len(idom)))
+
+        def find(node: int) -> int:
+            root = node
+            while rep[root] != root:
+                root = rep[root]
+            while rep[node] != root:
+                rep[node], node = root, rep[node]
+            return root
+
+        stamp = [-1] * len(idom)
+        loops = {}
+        for header in sorted(latches, key=tree._enter.__getitem__,
+                             reverse=True):
+            loop = loops[header] = Loop(header, latches[header], [header])
+            stamp[header] = header
+            stack = []
+            for latch in latches[header]:
+                latch = find(latch)
+                if stamp[latch] != header:
+                    stamp[latch] = header
+                    stack.append(latch)
+            while stack:
+                node = stack.pop()
+                inner = loops.get(node)
+                if inner is None:
+                    loop.body.append(node)
+                else:
+                    inner.parent = loop
+                    loop.children.append(inner)
+                rep[node] = header
+                for k in range(offsets[node], offsets[node + 1]):
+                    if idom[preds[k]] < 0:
+                        continue
+                    pred = find(preds[k])
+                    if stamp[pred] != header:
+                        stamp[pred] = header
+                        stack.append(pred)
+        loop_of = [None] * len(idom)
+        for loop in loops.values():
+            for node in loop.body:
+                loop_of[node] = loop
+            loop.children.sort(key=lambda child: child.header)
+        self.loop_of = loop_of
+        self.loops = sorted((loop for loop in loops.values()
+                             if loop.parent is None),
+                            key=lambda loop: loop.header)
+
+
+def dominators(source: Graph | Function) -> Dominance:
+    """
+    The dominance information of a graph, cached on the graph until it
+    changes, or of the graph of a function built for the occasion
+    """
+    if isinstance(source, Function):
+        source = Graph.build_func(source)
+    return source.cached('dominance', lambda: Dominance(source))
@@ -0,0 +1,45 @@
+class Interner:
+    """
+    Assigns each distinct name a small integer, in order of first use
+
+    >>> names = Interner()
+    >>> names.intern('a'), names.intern('b'), names.intern('a')
+    (0, 1, 0)
+    >>> names.name(1)
+    'b'
+    >>> names.lookup('b'), names.lookup('c'), len(names)
+    (1, None, 2)
+    """
+    names: list[str]
+
+    def __init__(self):
+        self.names = []
+        self._index = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, name: str) -> int:
+        sym = self._index.get(name)
+        if sym is None:
+            sym = self._index[name] = len(self.names)
+            self.names.append(name)
+        return sym
+
+    def lookup(self, name: str) -> int | None:
+        """ the integer of a name, None if it was never interned """
+        return self._index.get(name)
+
+    def name(self, sym: int) -> str:
+        return self.names[sym]
+
+
+# shared by the parser, the symbol table and the analyses, so a name has the
+# same integer in every program; tables indexed by it stay small and dense
+NAMES = Interner()
+
+
+if __name__ == "__main__": # pragma: no cover
+    import doctest
+    doctest.testmod()
+    print('OK')
@@ -1,10 +1,25 @@
-import sys
-from lark import Lark, ast_utils, Transformer, v_args
+import functools
+import hashlib
+import io
+import os
+import re
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from lark import Lark, Transformer, v_args
+from lark.ast_utils import camel_to_snake
+from lark.exceptions import LarkError, UnexpectedInput
+
+from . import ast as ast_module
 from .ast import *
+from .ast import _Ast, _AsList, _children
+from .util import cache_dir, SyntaxError
 
-__all__ = ['parse', 'parse_file']
+__all__ = ['parse', 'parse_file', 'parse_files', 'ParseResult',
+           'iter_functions', 'Edit', 'reparse']
 
-this_module = sys.modules[__name__]
+GRAMMAR = os.path.join(os.path.dirname(__file__), 'tip.lark')
 
 
 class ToAst(Transformer):
@@ -12,6 +27,10 @@ class ToAst(Transformer):
     def start(self, x: list):
         return Program(x)
 
+    @v_args(inline=True)
+    def id(self, token):
+        return Id(token.value, token.line, token.column)
+
     @v_args(inline=True)
     def string(self, s: str):
         return Const(AstType.STRING, s[1:-1])
@@ -117,17 +136,351 @@ class ToAst(Transformer):
         return DerefWrite(x)
 
 
-parser = Lark.open("tip.lark", parser="earley", rel_to=__file__)
-
-
-transformer = ast_utils.create_transformer(this_module, ToAst())
-
-
-def parse(text):
-    tree = parser.parse(text)
-    return transformer.transform(tree)
-
-
-def parse_file(filename):
+def create_transformer(transformer: Transformer) -> Transformer:
+    """
+    Add a callback building each AST class to the transformer,
+    like lark's ast_utils.create_transformer does for `ast_utils.Ast`,
+    rules the transformer already handles are left alone
+    """
+    for name, cls in vars(ast_module).items():
+        if (not name.startswith('_') and isinstance(cls, type)
+                and issubclass(cls, _Ast)):
+            rule = camel_to_snake(name)
+            if hasattr(transformer, rule):
+                continue
+            wrapper = v_args(inline=not issubclass(cls, _AsList))
+            setattr(transformer, rule, wrapper(cls).__get__(transformer))
+    return transformer
+
+
+MODES = ('earley', 'lalr')
+
+
+def grammar_digest() -> str:
+    with open(GRAMMAR, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def grammar_cache_file(mode: str) -> str:
+    """
+    The file caching the compiled parser tables, keyed by the grammar hash,
+    so editing tip.lark never loads stale tables
+    """
+    return os.path.join(cache_dir(), f'grammar-{mode}-{grammar_digest()}.lark')
+
+
+@functools.cache
+def get_transformer() -> Transformer:
+    return create_transformer(ToAst())
+
+
+def build_parser(mode: str, fused: bool = False) -> Lark:
+    """
+    Compile the grammar for the given mode
+    - fused: run the transformer from the LALR parser callbacks, so the AST
+      is built in a single pass and the parse tree is never materialised
+    - LALR tables are loaded from and saved to the on-disk cache,
+      lark does not support caching Earley parsers; without a usable
+      cache directory the grammar is compiled every time
+    """
+    options = {}
+    if fused:
+        options['transformer'] = get_transformer()
+    if mode == 'lalr':
+        try:
+            options['cache'] = grammar_cache_file(mode)
+        except OSError:
+            pass
+    return Lark.open(GRAMMAR, parser=mode, **options)
+
+
+# the grammar is LALR(1) conflict-free, so both modes build the same tree;
+# 'lalr' is much faster, 'earley' is kept as the reference implementation.
+# parsers are only built on first use, importing this module is cheap
+get_parser = functools.cache(build_parser)
+
+
+def parse(text, mode='earley', fused=False):
+    if mode not in MODES:
+        raise ValueError(f'Unknown parsing mode {mode!r}, want one of {MODES}')
+    if fused:
+        if mode != 'lalr':
+            raise ValueError('fused parsing is only supported with mode="lalr"')
+        return get_parser(mode, True).parse(text)
+    tree = get_parser(mode).parse(text)
+    return get_transformer().transform(tree)
+
+
+def parse_file(filename, mode='earley', fused=False, cache=None):
+    """
+    Parse a file
+    - cache: a `tipy.cache.ParseCache`, returning the cached program
+      without parsing when the file is unchanged
+    """
     with open(filename) as f:
-        return parse(f.read())
+        text = f.read()
+    if cache is None:
+        return parse(text, mode, fused)
+    key = cache.key(text)
+    program = cache.get(key)
+    if program is None:
+        program = parse(text, mode, fused)
+        cache.put(key, program)
+    return program
+
+
+@dataclass
+class ParseResult:
+    """ The program parsed from a file, or the error parsing it """
+    path: str
+    program: Program | None = None
+    error: Exception | None = None
+
+
+def _parse_error(path, e: Exception) -> Exception:
+    # lark exceptions refer to parser state and do not pickle reliably
+    if isinstance(e, LarkError):
+        return SyntaxError(f'{path}: {e}')
+    return e
+
+
+def _parse_to_bytes(path, mode, fused) -> tuple[bytes | None, Exception | None]:
+    """ parse in a worker process, the program is shipped back serialized """
+    try:
+        return parse_file(path, mode, fused).to_bytes(), None
+    except Exception as e:
+        return None, _parse_error(path, e)
+
+
+def parse_files(paths, workers=None, mode='earley', fused=False) -> list[ParseResult]:
+    """
+    Parse files in a pool of `workers` processes (default: one per CPU)
+    - results are in the order of `paths`
+    - a file that fails to parse gets a result with the error,
+      the other files are still parsed
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= 1:
+        results = []
+        for path in paths:
+            try:
+                results.append(ParseResult(path, parse_file(path, mode, fused)))
+            except Exception as e:
+                results.append(ParseResult(path, error=_parse_error(path, e)))
+        return results
+    # a few chunks per worker amortise the IPC and keep workers busy
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(workers) as executor:
+        shipped = list(executor.map(_parse_to_bytes, paths,
+                                    [mode] * len(paths), [fused] * len(paths),
+                                    chunksize=chunksize))
+    return [ParseResult(path, None if data is None else Program.from_bytes(data),
+                        error)
+            for path, (data, error) in zip(paths, shipped)]
+
+
+@dataclass
+class Chunk:
+    """ A piece of source, `line` and `column` (1-based) locate its start """
+    text: str
+    offset: int
+    line: int
+    column: int
+    # ends with the closing brace of a function
+    complete: bool
+
+
+# what the splitter must not misread: comments, strings and braces
+_SCAN = re.compile(r'//|/\*|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|[{}]')
+
+
+def split_functions(lines, offset=0, line=1, column=1):
+    """
+    Split source, an iterable of lines, into one chunk per top-level function
+    ending at the closing brace of its body, without parsing it; the text
+    after the last function is a final incomplete chunk.
+    Only the current function is kept in memory.
+    """
+    depth = 0
+    in_comment = False
+    parts = []
+    start = (offset, line, column)
+    for text in lines:
+        pos = 0
+        while pos < len(text):
+            if in_comment:
+                end = text.find('*/', pos)
+                if end < 0:
+                    break
+                in_comment = False
+                pos = end + 2
+                continue
+            match = _SCAN.search(text, pos)
+            if match is None:
+                break
+            token = match.group()
+            pos = match.end()
+            if token == '//':
+                break
+            elif token == '/*':
+                in_comment = True
+            elif token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth == 0:
+                    parts.append(text[:pos])
+                    chunk = ''.join(parts)
+                    yield Chunk(chunk, *start, True)
+                    text = text[pos:]
+                    offset += len(chunk)
+                    column = column + pos if len(parts) == 1 else pos + 1
+                    start = (offset, line, column)
+                    parts = []
+                    pos = 0
+        parts.append(text)
+        if text.endswith('\n'):
+            line += 1
+            column = 1
+        else:
+            column += len(text)
+    yield Chunk(''.join(parts), *start, False)
+
+
+def shift_positions(node, lines: int, columns: int, first: int = 1) -> None:
+    """
+    Move the `Id`s of a node `lines` lines down, and those on line `first`
+    `columns` columns right; by default from their position in a chunk to
+    their position in the whole source
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Id):
+            if node.pos is not None:
+                line, column = node.pos
+                node.pos = (line + lines,
+                            column + columns if line == first else column)
+        elif node is not None:
+            stack.extend(_children(node))
+
+
+def parse_chunk(chunk: Chunk, mode='earley', fused=False) -> Program:
+    """ parse a chunk, positions are relative to the whole source """
+    try:
+        program = parse(chunk.text, mode, fused)
+    except UnexpectedInput as e:
+        # unexpected end of input has no position
+        if e.line > 0:
+            if e.line == 1:
+                e.column += chunk.column - 1
+            e.line += chunk.line - 1
+        raise
+    if chunk.line != 1 or chunk.column != 1:
+        shift_positions(program, chunk.line - 1, chunk.column - 1)
+    return program
+
+
+def iter_functions(file, mode='earley', fused=False):
+    """
+    Parse a file, a path or a text file object, one function at a time,
+    yielding each `Function` as soon as it is parsed; memory is bounded by
+    the largest function. Positions are relative to the whole file.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        with open(file) as f:
+            yield from iter_functions(f, mode, fused)
+        return
+    for chunk in split_functions(file):
+        if chunk.complete or chunk.text.strip():
+            yield from parse_chunk(chunk, mode, fused).functions
+
+
+@dataclass
+class Edit:
+    """ Replace the characters [start, end) of a text by `text` """
+    start: int
+    end: int
+    text: str
+
+    def apply(self, text: str) -> str:
+        return text[:self.start] + self.text + text[self.end:]
+
+
+def _position(text: str, offset: int) -> tuple[int, int]:
+    """ line and column of an offset """
+    return text.count('\n', 0, offset) + 1, offset - text.rfind('\n', 0, offset)
+
+
+def reparse(program: Program, text: str, edit: Edit, mode='earley',
+            fused=False) -> Program:
+    """
+    Parse `edit.apply(text)`, where `program` was parsed from `text`,
+    parsing again only the functions the edit touches.
+    The other functions are the same objects as in `program`, those after
+    the edit have their positions moved in place.
+    """
+    functions = program.functions
+    new_text = edit.apply(text)
+    if any(function.name.pos is None for function in functions):
+        return parse(new_text, mode, fused)
+    # the text before the last function starting at or before the edit is
+    # unchanged, split both texts into functions from there
+    start_line, start_column = _position(text, edit.start)
+    first = bisect_right(functions, (start_line, start_column),
+                         key=lambda function: function.name.pos) - 1
+    if first < 0:
+        first, offset, line, column = 0, 0, 1, 1
+    else:
+        line, column = functions[first].name.pos
+        offset = edit.start - start_column + 1
+        for _ in range(start_line - line):
+            offset = text.rfind('\n', 0, offset - 1) + 1
+        offset += column - 1
+    old_chunks = split_functions(io.StringIO(text[offset:]), offset, line,
+                                 column)
+    new_chunks = split_functions(io.StringIO(new_text[offset:]), offset, line,
+                                 column)
+    # the split realigns once a function starts at the same place after the
+    # edit in both texts, the functions from there on are the same
+    delta = len(edit.text) - (edit.end - edit.start)
+    new_end = edit.start + len(edit.text)
+    parsed = []
+    replaced = 0
+    old_end = offset
+    for chunk in new_chunks:
+        if chunk.complete and chunk.offset + len(chunk.text) <= edit.start:
+            # a function ending before the edit is unchanged
+            next(old_chunks)
+            old_end = chunk.offset + len(chunk.text)
+            first += 1
+            continue
+        if chunk.offset >= new_end:
+            while old_end + delta < chunk.offset:
+                old = next(old_chunks)
+                if not old.complete:
+                    # past the last function, the texts never realign
+                    old_end = len(text) + 1
+                    break
+                old_end = old.offset + len(old.text)
+                replaced += 1
+            if old_end + delta == chunk.offset:
+                break
+        if chunk.complete or chunk.text.strip():
+            parsed.extend(parse_chunk(chunk, mode, fused).functions)
+        if not chunk.complete:
+            replaced = len(functions) - first
+            break
+    rest = functions[first + replaced:]
+    lines = edit.text.count('\n') - text.count('\n', edit.start, edit.end)
+    end_line, end_column = _position(text, edit.end)
+    columns = _position(new_text, new_end)[1] - end_column
+    if lines or columns:
+        for function in rest:
+            # without new lines only functions on the line of the edit move
+            if not lines and function.name.line != end_line:
+                break
+            shift_positions(function, lines, columns, end_line)
+    return Program(functions[:first] + parsed + rest)
+
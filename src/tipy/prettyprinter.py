@@ -9,17 +9,17 @@ class PrettyPrinter(AstVisitor):
     @classmethod
     def print(cls, ast: Program):
         pp = cls()
-        ast.accept(pp)
+        pp.visit(ast)
 
     def visit_program(self, node: Program):
         raise NotImplementedError("PrettyPrinter.visit_program")
 
     def visit_function(self, node: Function):
         print(' ' * self.indent, 'fun', end=' ')
-        node.name.accept(self)
-        node.parameters.accept(self)
+        self.visit(node.name)
+        self.visit(node.parameters)
         self.indent += 2
-        node.body.accept(self)
+        self.visit(node.body)
         self.indent -= 2
 
     def visit_id(self, node: Id):
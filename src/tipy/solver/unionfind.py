@@ -7,8 +7,12 @@ def find(x: Type) -> Type:
     """
     returns the representative of the set that x belongs to
     """
-    if x.parent != x:
-        x.parent = find(x.parent)
+    path = []
+    while x.parent != x:
+        path.append(x)
+        x = x.parent
+    for t in path:
+        t.parent = x.parent
     return x.parent
 
 
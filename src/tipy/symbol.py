@@ -1,16 +1,11 @@
+from bisect import bisect_right
+
 from .ast import *
-from .visitor import AstVisitor
+from .names import NAMES
+from .visitor import AstWalker
 from .util import SymbolError
 
 
-class SpecialSymbol:
-    pass
-
-
-# Singleton
-SpecialSymbol = SpecialSymbol()
-
-
 class SymbolContext:
     """
     >>> from .ast import *
@@ -25,98 +20,196 @@ class SymbolContext:
     >>> assert st.get('a') == 'string'
     >>> st.exit_scope()
     >>> assert st.get('a') == 'int'
+    >>> assert st.get(NAMES.intern('a')) == 'int'
+
+    names are interned in `NAMES`, the bindings of a name are stacked under
+    its integer in a dict, so a context costs only the names it binds however
+    many the process has interned; each scope logs the names pushed in it, so
+    leaving a scope pops exactly those bindings
     """
-    symbols: dict[str, list[Id]]
+    symbols: dict[int, list[Id]]
+    scopes: list[list[int]]
 
     def __init__(self):
         self.symbols = {}
+        self.scopes = []
 
     def enter_scope(self) -> None:
-        for v in self.symbols.values():
-            v.append(SpecialSymbol)
+        self.scopes.append([])
 
     def exit_scope(self) -> None:
-        for v in self.symbols.values():
-            while v[-1] is not SpecialSymbol:
-                v.pop()
-            if v[-1] is SpecialSymbol:
-                v.pop()
-
-    def push(self, name: str, id: Id) -> None:
-        if name not in self.symbols:
-            self.symbols[name] = [SpecialSymbol]
-        self.symbols[name].append(id)
-
-    def get(self, name: str) -> Id | None:
-        if name not in self.symbols:
-            return None
-        for v in reversed(self.symbols[name]):
-            if v is not SpecialSymbol:
-                return v
-        return None
-
-
-class SymbolTable(AstVisitor):
+        symbols = self.symbols
+        for sym in self.scopes.pop():
+            symbols[sym].pop()
+
+    def push(self, name: str | int, id: Id) -> None:
+        sym = name if type(name) is int else NAMES.intern(name)
+        v = self.symbols.get(sym)
+        if v is None:
+            self.symbols[sym] = [id]
+        else:
+            v.append(id)
+        if self.scopes:
+            self.scopes[-1].append(sym)
+
+    def get(self, name: str | int) -> Id | None:
+        # looking up a name never interns it
+        sym = name if type(name) is int else NAMES.lookup(name)
+        v = self.symbols.get(sym)
+        return v[-1] if v else None
+
+
+class SymbolTable(AstWalker):
+    """
+    Binds every `Id` of a program to its declaration
+
+    symbols : use -> declaration, None for an undefined name
+    uses : declaration -> its uses, in program order
+    undefined : the uses of undefined names, in program order
+
+    After an edit, `rebuild(old, new)` replaces the bindings of one function
+    without walking the rest of the program; the uses it finds are merged
+    into the others by position, so they stay in program order as long as
+    the ids have positions, as parsed or reparsed ones do.
+    """
     symbols: dict[Id, Id]
+    uses: dict[Id, list[Id]]
+    undefined: list[Id]
     context: SymbolContext
 
     def __init__(self):
         self.symbols = {}
+        self.uses = {}
+        self.undefined = []
         self.context = SymbolContext()
     
     def show(self):
         for name, id in self.symbols.items():
-            print(f"{name.value} line{name.token.line} -> line{id.token.line}")
+            print(f"{name.value} line{name.line} -> line{id.line}")
 
     @classmethod
     def build(cls, ast: Program) -> "SymbolTable":
         st = cls()
-        ast.accept(st)
-        for name, id in st.symbols.items():
-            if id is None:
-                raise SymbolError(
-                    f'Undefined variable {name} with line {name.token.line}')
+        st.walk(ast)
+        st._check(st.undefined)
         return st
 
+    def _check(self, undefined: list[Id]) -> None:
+        if undefined:
+            name = undefined[0]
+            raise SymbolError(
+                f'Undefined variable {name} with line {name.line}')
+
     def get(self, name: Id) -> Id:
         return self.symbols[name]
 
-    def visit_vardecl(self, node: Vardecl):
+    def references(self, decl: Id) -> list[Id]:
+        """ the uses of a declaration """
+        return self.uses.get(decl, [])
+
+    def rebuild(self, old: Function, new: Function) -> None:
+        """
+        Replace the bindings of function `old` by those of `new`, which has
+        the same name; uses of the function elsewhere are bound to `new.name`
+        """
+        if old.name.sym != new.name.sym:
+            raise ValueError(f'Cannot rebuild {old.name} as {new.name}, '
+                             'a renamed function needs a new table')
+        symbols, uses = self.symbols, self.uses
+        removed = {node for node in walk(old) if type(node) is Id}
+        callers = [use for use in uses.pop(old.name, ())
+                   if use not in removed]
+        changed = set()
+        for node in removed:
+            decl = symbols.pop(node, None)
+            uses.pop(node, None)
+            if decl is not None and decl not in removed:
+                changed.add(decl)
+        for decl in changed:
+            uses[decl] = [use for use in uses[decl] if use not in removed]
+        if any(use in removed for use in self.undefined):
+            self.undefined = [use for use in self.undefined
+                              if use not in removed]
+        # the program scope binds the function name to the new declaration
+        bindings = self.context.symbols[new.name.sym]
+        for i, decl in enumerate(bindings):
+            if decl is old.name:
+                bindings[i] = new.name
+        for use in callers:
+            symbols[use] = new.name
+        uses[new.name] = callers
+        undefined = len(self.undefined)
+        self.walk(new)
+        added = self.undefined[undefined:]
+        # the uses in `new` were appended to those of the other functions
+        counts = {}
+        for node in walk(new):
+            if type(node) is Id and node in symbols:
+                decl = symbols[node]
+                counts[decl] = counts.get(decl, 0) + 1
+        for decl, count in counts.items():
+            _merge_last(self.undefined if decl is None else uses[decl], count)
+        self._check(added)
+
+    def enter_vardecl(self, node: Vardecl):
         for id in node.ids:
-            self.context.push(id.value, id)
-
-    def visit_id(self, node: Id):
-        self.symbols[node] = self.context.get(node.value)
-
-    def visit_record(self, node: Record):
-        pass
-
-    def visit_access(self, node: Access):
-        node.name.accept(self)
-    
-    def visit_direct_field_write(self, node: DirectFieldWrite):
-        node.name.accept(self)
-    
-    def visit_indirect_field_write(self, node: IndirectFieldWrite):
-        node.expr.accept(self)
-
-    def visit_parameters(self, node: Parameters):
+            self.context.push(id.sym, id)
+        return []
+
+    def enter_id(self, node: Id):
+        decl = self.context.get(node.sym)
+        self.symbols[node] = decl
+        if decl is None:
+            self.undefined.append(node)
+        else:
+            uses = self.uses.get(decl)
+            if uses is None:
+                self.uses[decl] = [node]
+            else:
+                uses.append(node)
+
+    def enter_record(self, node: Record):
+        return []
+
+    def enter_access(self, node: Access):
+        return [node.name]
+
+    def enter_direct_field_write(self, node: DirectFieldWrite):
+        return [node.name]
+
+    def enter_indirect_field_write(self, node: IndirectFieldWrite):
+        return [node.expr]
+
+    def enter_parameters(self, node: Parameters):
         for param in node.params:
-            self.context.push(param.value, param)
+            self.context.push(param.sym, param)
+        return []
 
-    def visit_program(self, node: Program):
+    def enter_program(self, node: Program):
         for func in node.functions:
-            self.context.push(func.name.value, func.name)
-        super().visit_program(node)
+            self.context.push(func.name.sym, func.name)
 
-    def visit_function(self, node: Function):
+    def enter_function(self, node: Function):
         self.context.enter_scope()
-        node.name.accept(self)
-        node.parameters.accept(self)
-        node.body.accept(self)
+
+    def leave_function(self, node: Function):
         self.context.exit_scope()
 
 
+def _merge_last(uses: list[Id], count: int) -> None:
+    """ move the last count uses, in order, to their place by position among
+    the others, also in order """
+    if count == len(uses) or any(use.pos is None for use in uses):
+        return
+    first = uses[-count].pos
+    if uses[-count - 1].pos < first:
+        return
+    added = uses[-count:]
+    del uses[-count:]
+    i = bisect_right(uses, first, key=lambda use: use.pos)
+    uses[i:i] = added
+
+
 if __name__ == "__main__": # pragma: no cover
     import doctest
     doctest.testmod()
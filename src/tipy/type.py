@@ -7,9 +7,14 @@ class Type:
         """
         find the representative of the set that this type belongs to
         """
-        if self.parent != self:
-            self.parent = self.parent.find_parent()
-        return self.parent
+        path = []
+        node = self
+        while node.parent != node:
+            path.append(node)
+            node = node.parent
+        for t in path:
+            t.parent = node.parent
+        return node.parent
 
     def contain(self, t: 'Type') -> bool:
         return False
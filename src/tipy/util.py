@@ -1,3 +1,6 @@
+import os
+
+
 class TipyException(Exception):
     pass
 
@@ -55,3 +58,15 @@ def get_output(func, *args, **kwargs) -> str:
     func(*args, **kwargs)
     sys.stdout = old_stdout
     return mystdout.getvalue()
+
+
+def cache_dir() -> str:
+    """
+    Directory of tipy's on-disk caches,
+    `$TIPY_CACHE_DIR` or `tipy` in the user cache directory
+    """
+    path = os.environ.get('TIPY_CACHE_DIR') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+        'tipy')
+    os.makedirs(path, exist_ok=True)
+    return path
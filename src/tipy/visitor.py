@@ -1,31 +1,106 @@
+from typing import Callable
+
 from .ast import *
+from .ast import _LEAF, _ONE, _SOME, _LIST, _WALKERS, _children, \
+    _push_children
 
 
 class Visitor:
     pass
 
 
+# the handler of each node class
+HANDLERS = {
+    Program: 'visit_program',
+    Function: 'visit_function',
+    FunBlock: 'visit_funblock',
+    Vardecl: 'visit_vardecl',
+    Id: 'visit_id',
+    Const: 'visit_const',
+    Error: 'visit_error',
+    BinaryExpr: 'visit_binary_expr',
+    UnaryExpr: 'visit_unary_expr',
+    Call: 'visit_call',
+    Return: 'visit_return',
+    If: 'visit_if',
+    While: 'visit_while',
+    Reference: 'visit_reference',
+    Deref: 'visit_deref',
+    Assign: 'visit_assign',
+    Alloc: 'visit_alloc',
+    DirectFieldWrite: 'visit_direct_field_write',
+    Input: 'visit_input',
+    IndirectFieldWrite: 'visit_indirect_field_write',
+    DerefWrite: 'visit_deref_write',
+    Record: 'visit_record',
+    Access: 'visit_access',
+    Parameters: 'visit_parameters',
+    Block: 'visit_block',
+    Output: 'visit_output',
+}
+
+
 class AstVisitor(Visitor):
-    def visit_program(self, node: Program):
-        for func in node.functions:
-            func.accept(self)
-
-    def visit_function(self, node: Function):
-        node.name.accept(self)
-        node.parameters.accept(self)
-        node.body.accept(self)
-
-    def visit_funblock(self, node: FunBlock):
-        for varstmt in node.varstmts:
-            varstmt.accept(self)
-        for stmt in node.stmts:
-            stmt.accept(self)
-        if node.returnstmt is not None:
-            node.returnstmt.accept(self)
-
-    def visit_vardecl(self, node: Vardecl):
-        for name in node.ids:
-            name.accept(self)
+    """
+    `visit(node)` calls the handler of the node class, looked up in a table
+    built once per visitor class, `node.accept(visitor)` calls the same
+    handler. The default handlers visit the children with an explicit
+    stack: a descendant whose handler is not overridden is expanded in
+    place, the others are called in source order, so only overridden
+    handlers calling `visit` nest Python frames.
+    """
+    _dispatch: dict[type, Callable]
+    # the node classes whose handler is the default one
+    _default: frozenset[type]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._build_dispatch()
+
+    @classmethod
+    def _build_dispatch(cls) -> None:
+        cls._dispatch = {node: getattr(cls, name)
+                         for node, name in HANDLERS.items()}
+        cls._default = frozenset(
+            node for node, name in HANDLERS.items()
+            if getattr(cls, name) is getattr(AstVisitor, name))
+
+    def visit(self, node):
+        try:
+            handler = self._dispatch[type(node)]
+        except KeyError:
+            raise TypeError(f'No handler for {type(node).__name__}') from None
+        return handler(self, node)
+
+    def _visit_children(self, node) -> None:
+        dispatch = self._dispatch
+        default = self._default
+        # `_push_children` inlined, as in `walk`
+        stack = []
+        _push_children(stack, node)
+        pop = stack.pop
+        push = stack.append
+        walkers = _WALKERS
+        leaf, one, some, list_ = _LEAF, _ONE, _SOME, _LIST
+        while stack:
+            node = pop()
+            if node is None:
+                continue
+            cls = type(node)
+            if cls not in default:
+                dispatch[cls](self, node)
+                continue
+            kind, get = walkers[cls]
+            if kind == leaf:
+                continue
+            elif kind == one:
+                push(get(node))
+            elif kind == some:
+                stack += get(node)
+            elif kind == list_:
+                stack += reversed(get(node))
+            else:
+                stack += reversed(_children(node))
 
     def visit_id(self, node: Id):
         pass
@@ -33,81 +108,72 @@ class AstVisitor(Visitor):
     def visit_const(self, node: Const):
         pass
 
-    def visit_error(self, node: Error):
-        node.value.accept(self)
-
-    def visit_binary_expr(self, node: BinaryExpr):
-        node.left.accept(self)
-        node.right.accept(self)
-
-    def visit_unary_expr(self, node: UnaryExpr):
-        node.expr.accept(self)
-
-    def visit_call(self, node: Call):
-        node.name.accept(self)
-        for arg in node.args:
-            arg.accept(self)
-
-    def visit_return(self, node: Return):
-        node.expr.accept(self)
-
-    def visit_if(self, node: If):
-        node.cond.accept(self)
-        node.then.accept(self)
-        if node.else_ is not None:
-            node.else_ .accept(self)
-
-    def visit_while(self, node: While):
-        node.cond.accept(self)
-        node.body.accept(self)
-
-    def visit_reference(self, node: Reference):
-        node.name.accept(self)
-
-    def visit_deref(self, node: Deref):
-        node.expr.accept(self)
-
-    def visit_assign(self, node: Assign):
-        node.name.accept(self)
-        node.expr.accept(self)
-
-    def visit_alloc(self, node: Alloc):
-        node.expr.accept(self)
-
-    def visit_direct_field_write(self, node: DirectFieldWrite):
-        node.name.accept(self)
-        node.field.accept(self)
-    
     def visit_input(self, node: Input):
         pass
 
-    def visit_indirect_field_write(self, node: IndirectFieldWrite):
-        node.expr.accept(self)
-        node.field.accept(self)
-
-    def visit_deref_write(self, node: DerefWrite):
-        node.expr.accept(self)
-
-    def visit_record(self, node: Record):
-        for field in node.fields:
-            field[0].accept(self)
-            field[1].accept(self)
-
-    def visit_access(self, node: Access):
-        node.name.accept(self)
-        for field in node.fields:
-            field.accept(self)
-
-    def visit_parameters(self, node: Parameters):
-        for param in node.params:
-            param.accept(self)
-
-    def visit_block(self, node: Block):
-        for stmt in node.stmts:
-            stmt.accept(self)
+    visit_program = visit_function = visit_funblock = visit_vardecl = \
+        visit_error = visit_binary_expr = visit_unary_expr = visit_call = \
+        visit_return = visit_if = visit_while = visit_reference = \
+        visit_deref = visit_assign = visit_alloc = \
+        visit_direct_field_write = visit_indirect_field_write = \
+        visit_deref_write = visit_record = visit_access = \
+        visit_parameters = visit_block = visit_output = _visit_children
+
+
+AstVisitor._build_dispatch()
+
+
+class AstWalker(Visitor):
+    """
+    Walk an AST with an explicit stack, so deep nesting never reaches the
+    recursion limit. `enter_xxx(node)` is called before the children of a
+    node and `leave_xxx(node)` after them, `xxx` as in `visit_xxx`; the
+    children are walked in source order, unless `enter_xxx` returns the
+    list of children to walk instead.
+    """
+    _enter: dict[type, Callable]
+    _leave: dict[type, Callable]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._enter, cls._leave = {}, {}
+        for node, name in HANDLERS.items():
+            name = name.removeprefix('visit_')
+            if hasattr(cls, 'enter_' + name):
+                cls._enter[node] = getattr(cls, 'enter_' + name)
+            if hasattr(cls, 'leave_' + name):
+                cls._leave[node] = getattr(cls, 'leave_' + name)
+
+    def walk(self, root) -> None:
+        enter = self._enter
+        leave = self._leave
+        # nodes to walk, `None` for absent ones, and (leave handler, node)
+        # once their children are walked; children never are tuples, record
+        # fields are flattened
+        stack = [root]
+        pop = stack.pop
+        while stack:
+            node = pop()
+            cls = type(node)
+            if cls is tuple:
+                handler, node = node
+                handler(self, node)
+                continue
+            elif node is None:
+                continue
+            handler = enter.get(cls)
+            children = None if handler is None else handler(self, node)
+            handler = leave.get(cls)
+            if handler is not None:
+                stack.append((handler, node))
+            if children is None:
+                _push_children(stack, node)
+            else:
+                stack += reversed(children)
+
+
+AstWalker._enter, AstWalker._leave = {}, {}
 
-    def visit_output(self, node: Output):
-        node.expr.accept(self)
 
 class CFGVisitor(Visitor):
     pass
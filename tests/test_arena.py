@@ -0,0 +1,61 @@
+import unittest
+
+from tipy.arena import Arena
+from tipy.ast import *
+from tipy.parser import parse, parse_file
+
+from .util import TipyTest
+
+
+class TestArena(TipyTest):
+
+    def test_all_file(self):
+        for file in self.file_lists:
+            if file.endswith(".tip"):
+                prog = parse_file("tip_examples/" + file, 'lalr')
+                arena = Arena.from_program(prog)
+                self.assertAstEqual(prog, arena.to_program(), file)
+
+    def test_layout(self):
+        prog = parse("""
+        f(a) {
+            var x;
+            if (a > 1) { x = {g: -a}; }
+            return x.g;
+        }
+        """, 'lalr')
+        arena = Arena.from_program(prog)
+        self.assertIs(arena.kind(0), Program)
+        self.assertEqual(arena.parents[0], -1)
+        self.assertEqual(arena.ends[0], len(arena))
+        for i in range(1, len(arena)):
+            parent = arena.parents[i]
+            self.assertLess(parent, i)
+            self.assertLessEqual(arena.ends[i], arena.ends[parent])
+        ifs = [i for i in range(len(arena)) if arena.kind(i) is If]
+        self.assertEqual(len(ifs), 1)
+        cond, then, else_ = arena.child_ids(ifs[0])
+        self.assertIs(arena.kind(cond), BinaryExpr)
+        self.assertIs(arena.kind(then), Block)
+        self.assertEqual(else_, -1)
+        # symbols are shared by every Id of the same name
+        names = [arena.values[i] for i in range(len(arena))
+                 if arena.kind(i) is Id]
+        self.assertEqual(len(set(names)), len(arena.symbols))
+        self.assertEqual(sorted(arena.symbols), ['a', 'f', 'g', 'x'])
+
+    def test_views(self):
+        prog = parse("main() { var x; x = 1 + 2; return x; }", 'lalr')
+        arena = Arena.from_program(prog)
+        assign = arena.node(0).functions[0].body.stmts[0]
+        self.assertIsInstance(assign, Assign)
+        i = arena.index(assign)
+        self.assertIs(arena.node(i), assign)
+        self.assertIs(arena.node(arena.child_ids(i)[1]), assign.expr)
+        # facts in a list indexed by node ID
+        constants = [arena.kind(i) is Const for i in range(len(arena))]
+        self.assertEqual(constants.count(True), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
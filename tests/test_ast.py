@@ -0,0 +1,88 @@
+import io
+import unittest
+from dataclasses import fields
+
+from tipy.ast import *
+from tipy.ast import _WALKERS
+from tipy.parser import parse, parse_file
+from tipy.util import get_output
+
+from .util import TipyTest, DEPTH, deep_expression
+
+
+class TestAst(TipyTest):
+
+    def test_child_fields(self):
+        # the fields that are not children are names, operators and values
+        others = {Const: {'type_', 'value'}, BinaryExpr: {'op'},
+                  UnaryExpr: {'op'}}
+        for cls in _WALKERS:
+            if cls is Id:
+                continue
+            names = {f.name for f in fields(cls)}
+            self.assertEqual(set(cls.child_fields) | others.get(cls, set()),
+                             names, cls.__name__)
+
+    def test_iter_children(self):
+        prog = parse("""main() {
+            var r, a;
+            r = {x: 1, y: a};
+            if (a) { output r.x; }
+            return a;
+        }""", 'lalr')
+        body = prog.functions[0].body
+        assign, if_ = body.stmts
+        self.assertEqual(list(iter_children(body)),
+                         [*body.varstmts, *body.stmts, body.returnstmt])
+        record = assign.expr
+        self.assertEqual([str(n) for n in iter_children(record)],
+                         ['x', str(record.fields[0][1]), 'y', 'a'])
+        # the absent else is skipped
+        self.assertEqual(list(iter_children(if_)), [if_.cond, if_.then])
+        self.assertEqual(list(iter_children(Id('a'))), [])
+
+    def test_walk(self):
+        for file in self.file_lists:
+            if not file.endswith(".tip"):
+                continue
+            prog = parse_file("tip_examples/" + file, 'lalr')
+            nodes = list(walk(prog))
+            self.assertIs(nodes[0], prog)
+            # pre-order: every node follows its parent, children in order
+            index = {id(node): i for i, node in enumerate(nodes)}
+            self.assertEqual(len(index), len(nodes), file)
+            for node in nodes:
+                children = [index[id(c)] for c in iter_children(node)]
+                self.assertEqual(children, sorted(children), file)
+                self.assertTrue(all(c > index[id(node)] for c in children))
+
+    def test_render(self):
+        prog = parse("""main(a) {
+            var r, p;
+            r = {x: 1, y: a};
+            p = &a;
+            *p = r.x + f(a, 1);
+            r.x = (*p).y;
+            if (a) { output r.x; } else while (a > 0) a = a - 1;
+            error a;
+            return input;
+        }""", 'lalr')
+        self.assertEqual(render(prog), get_output(prog.dump))
+        assign = prog.functions[0].body.stmts[2]
+        self.assertEqual(render(assign, 2),
+                         "   * *  p =  +  r . x   f (  a  1 ) ;\n")
+        out = io.StringIO()
+        write_source(prog, out.write, 4)
+        self.assertEqual(out.getvalue(), render(prog, 4))
+
+    def test_render_deep(self):
+        text = render(deep_expression())
+        self.assertEqual(text.count(' a '), DEPTH + 3)
+
+    def test_walk_deep(self):
+        ids = [n for n in walk(deep_expression()) if type(n) is Id]
+        self.assertEqual(len(ids), DEPTH + 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from tipy import cache as cache_module
+from tipy.cache import ParseCache
+from tipy.parser import parse_file
+
+from .util import TipyTest
+
+
+class TestCache(TipyTest):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'TIPY_CACHE_DIR': self.tmp.name})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_hit_miss(self):
+        cache = ParseCache()
+        for file in self.file_lists:
+            if file.endswith(".tip"):
+                first = parse_file("tip_examples/" + file, 'lalr', cache=cache)
+                second = parse_file("tip_examples/" + file, 'lalr', cache=cache)
+                self.assertAstEqual(first, second, file)
+        files = len([f for f in self.file_lists if f.endswith(".tip")])
+        stats = cache.stats()
+        # files with the same content share an entry
+        self.assertGreaterEqual(stats['hits'], files)
+        self.assertEqual(stats['hits'] + stats['misses'], 2 * files)
+        self.assertEqual(stats['entries'], stats['misses'])
+
+    def test_key(self):
+        cache = ParseCache()
+        self.assertEqual(cache.key('main() { return 0; }'),
+                         cache.key('main() { return 0; }'))
+        self.assertNotEqual(cache.key('main() { return 0; }'),
+                            cache.key('main() { return 1; }'))
+        key = cache.key('main() { return 0; }')
+        with mock.patch.object(cache_module, 'grammar_digest', lambda: 'new'):
+            self.assertNotEqual(ParseCache().key('main() { return 0; }'), key)
+        # the grammar is hashed when the cache is made, not for every key
+        with mock.patch.object(cache_module, 'grammar_digest') as digest:
+            cache.key('main() { return 2; }')
+        digest.assert_not_called()
+
+    def test_corrupt(self):
+        cache = ParseCache()
+        first = parse_file("tip_examples/fib.tip", cache=cache)
+        [entry] = cache.entries()
+        with open(entry.path, 'r+b') as f:
+            f.seek(12)
+            byte = f.read(1)
+            f.seek(12)
+            f.write(bytes([byte[0] ^ 0xff]))
+        # a miss, the entry is replaced
+        second = parse_file("tip_examples/fib.tip", cache=cache)
+        self.assertAstEqual(first, second)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        parse_file("tip_examples/fib.tip", cache=cache)
+        self.assertEqual(cache.hits, 1)
+
+    def test_failed_write(self):
+        cache = ParseCache()
+        with mock.patch.object(os, 'replace', side_effect=OSError('full')):
+            self.assertException(parse_file, OSError,
+                                 "tip_examples/fib.tip", cache=cache)
+        self.assertEqual(os.listdir(cache.directory), [])
+
+    def test_put_scans_once(self):
+        cache = ParseCache()
+        files = [f for f in self.file_lists if f.endswith(".tip")]
+        with mock.patch.object(cache, 'entries',
+                               wraps=cache.entries) as entries:
+            for file in files:
+                parse_file("tip_examples/" + file, cache=cache)
+        self.assertEqual(entries.call_count, 1)
+        # over max_bytes the cache is evicted down to 90% of it
+        cache.max_bytes = cache.size() // 2
+        program = parse_file("tip_examples/fib.tip", cache=cache)
+        cache.put(cache.key('a new source'), program)
+        self.assertLessEqual(cache.size(), cache.max_bytes * 9 // 10)
+
+    def test_evict(self):
+        cache = ParseCache(max_bytes=0)
+        parse_file("tip_examples/fib.tip", cache=cache)
+        self.assertEqual(cache.stats()['entries'], 0)
+        cache = ParseCache()
+        files = ["tip_examples/fib.tip", "tip_examples/map.tip"]
+        for file in files:
+            parse_file(file, cache=cache)
+        # map.tip is the least recently used and evicted first
+        for entry in cache.entries():
+            os.utime(entry.path, (0, 0))
+        parse_file(files[0], cache=cache)
+        cache.max_bytes = cache.size() - 1
+        cache.evict()
+        parse_file(files[0], cache=cache)
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertEqual(cache.hits, 2)
+
+    def test_clear(self):
+        cache = ParseCache()
+        parse_file("tip_examples/fib.tip", 'lalr', cache=cache)
+        self.assertEqual(cache.stats()['entries'], 1)
+        subprocess.run([sys.executable, '-m', 'tipy', 'cache', 'clear'],
+                       check=True)
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual(os.listdir(self.tmp.name), ['ast'])
+
+
+if __name__ == '__main__':
+    unittest.main()
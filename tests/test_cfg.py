@@ -1,9 +1,14 @@
+import importlib.util
+import io
+import json
 import unittest
 
+from tipy.ast import Id, render
 from tipy.parser import parse
 from tipy.cfg import *
+from tipy.dominance import dominators
 
-from .util import TipyTest
+from .util import TipyTest, DEPTH, deep_blocks, deep_loops
 
 
 class TestCFG(TipyTest):
@@ -35,7 +40,9 @@ class TestCFG(TipyTest):
             else:
                 self.assertEqual(len(pred), 1)
                 self.assertEqual(len(succ), 1)
-                str(node)
+                self.assertEqual(str(node), render(node.value))
+            # rendered once
+            self.assertIs(str(node), str(node))
 
     def test_if(self):
         prog = """main(a) {
@@ -104,5 +111,405 @@ class TestCFG(TipyTest):
                 self.assertIsInstance(edge.in_, Condition)
                 self.assertIsInstance(edge.out, Exit)
 
+    def test_short_if(self):
+        prog = parse("""main(a) {
+            if (a > 0) a = 1; else a = 2;
+            while (a > 0) a = a - 1;
+            return a;
+        }""")
+        cfg = Graph.build_prog(prog)
+        self.assertEqual(len(cfg.nodes), 7)
+        self.assertEqual(len(cfg.edges), 8)
+
+    def test_adjacency(self):
+        prog = parse("""main(a) {
+            while (a > 0) { if (a > 1) a = a - 2; else a = a - 1; }
+            return a;
+        }""")
+        cfg = Graph.build_prog(prog)
+        for node in cfg.nodes:
+            self.assertEqual(list(node.succ_edges()),
+                             [e for e in cfg.edges if e.in_ is node])
+            self.assertEqual(list(node.pred_edges()),
+                             [e for e in cfg.edges if e.out is node])
+        cond = next(n for n in cfg.nodes if isinstance(n, Condition))
+        edge = next(cond.succ_edges())
+        cfg.remove_edge(edge)
+        self.assertNotIn(edge, cfg.edges)
+        self.assertNotIn(edge, list(edge.out.pred_edges()))
+        cfg.remove_node(cond)
+        self.assertNotIn(cond, cfg.nodes)
+        self.assertFalse(any(cond in (e.in_, e.out) for e in cfg.edges))
+        for node in cfg.nodes:
+            self.assertNotIn(cond, list(node.succ_nodes()))
+        # a graph made of existing nodes and edges is indexed too
+        copy = Graph(cfg.nodes, cfg.edges)
+        for node in cfg.nodes:
+            self.assertEqual(copy.succs[node], cfg.succs[node])
+
+    def test_csr(self):
+        prog = parse("""main(a) {
+            while (a > 0) { if (a > 1) a = a - 2; else a = a - 1; }
+            return a;
+        }
+        f() { return 0; }""")
+        cfg = Graph.build_prog(prog)
+        self.assertEqual([n.index for n in cfg.nodes], list(range(8)))
+        self.assertEqual([e.index for e in cfg.edges], list(range(8)))
+        csr = cfg.csr()
+        self.assertIs(cfg.csr(), csr)
+        self.assertEqual(len(csr.offsets), len(cfg.nodes) + 1)
+        kinds = {Edge: EDGE, TrueEdge: TRUE, FalseEdge: FALSE}
+        for node in cfg.nodes:
+            self.assertEqual(list(csr.neighbours(node.index)),
+                             [n.index for n in node.succ_nodes()])
+            start, end = csr.offsets[node.index], csr.offsets[node.index + 1]
+            self.assertEqual(list(csr.kinds[start:end]),
+                             [kinds[type(e)] for e in node.succ_edges()])
+            self.assertEqual([cfg.edges[i] for i in csr.edges[start:end]],
+                             list(node.succ_edges()))
+        reverse = cfg.csr(reverse=True)
+        for node in cfg.nodes:
+            self.assertEqual(list(reverse.neighbours(node.index)),
+                             [n.index for n in node.pred_nodes()])
+        # changes renumber and drop the cached views
+        cond = next(n for n in cfg.nodes if isinstance(n, Condition))
+        cfg.remove_node(cond)
+        self.assertEqual([n.index for n in cfg.nodes], list(range(7)))
+        self.assertEqual([e.index for e in cfg.edges],
+                         list(range(len(cfg.edges))))
+        self.assertIsNot(cfg.csr(), csr)
+        self.assertEqual(cfg.csr().offsets[-1], len(cfg.edges))
+        # removals in a row keep the other numbers until the lists are read
+        first, second = [n for n in cfg.nodes if type(n) is Node][:2]
+        index = second.index
+        cfg.remove_node(first)
+        self.assertEqual(second.index, index)
+        cfg.remove_node(second)
+        self.assertEqual([n.index for n in cfg.nodes], list(range(5)))
+        self.assertEqual([e.index for e in cfg.edges],
+                         list(range(len(cfg.edges))))
+        self.assertNotIn(first, cfg.nodes)
+        self.assertEqual(cfg.csr().offsets[-1], len(cfg.edges))
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'needs NumPy')
+    def test_csr_numpy(self):  # pragma: no cover
+        cfg = Graph.build_prog(parse("main(a) { a = 1; return a; }"))
+        offsets, targets, kinds, edges = cfg.csr().to_numpy()
+        self.assertEqual(list(targets), list(cfg.csr().targets))
+        self.assertEqual(len(offsets), len(cfg.nodes) + 1)
+
+    def test_program_cfg(self):
+        prog = parse("""main(a) {
+            var b;
+            b = f(a);
+            while (b > 0) { b = b - 1; }
+            return b;
+        }
+        f(x) { return x; }""")
+        cfg = ProgramCFG(prog)
+        self.assertEqual(list(cfg), ['main', 'f'])
+        self.assertEqual(len(cfg), 2)
+        self.assertIn('f', cfg)
+        self.assertNotIn('g', cfg)
+        graph = cfg['main']
+        self.assertEqual(list(cfg.built()), ['main'])
+        self.assertIs(cfg['main'], graph)
+        self.assertIsInstance(graph.entry, Entry)
+        self.assertIsInstance(graph.exit, Exit)
+        self.assertEqual(str(graph.entry), 'main(a)')
+        self.assertEqual(graph.entry.index, 0)
+        self.assertEqual(list(graph.entry.pred_nodes()), [])
+        self.assertEqual(list(graph.exit.succ_nodes()), [])
+        # the same nodes as the graph of the whole program
+        whole = Graph.build_prog(prog)
+        self.assertEqual(sum(len(g.nodes) for _, g in cfg.items()),
+                         len(whole.nodes))
+        self.assertEqual(sum(len(g.edges) for _, g in cfg.items()),
+                         len(whole.edges))
+        self.assertIsNone(whole.entry)
+        self.assertRaises(KeyError, cfg.__getitem__, 'g')
+
+    def test_write_dot(self):
+        prog = parse('main(a) { if (a > 0) a = "q\\""; return a; }\n'
+                     'f() { return 1; }')
+        cfg = Graph.build_prog(prog)
+        out = io.StringIO()
+        cfg.write_dot(out)
+        self.assertEqual(out.getvalue(), """digraph cfg {
+  subgraph cluster_0 {
+    label="main";
+    n0 [label="main(a)"];
+    n1 [label=" return  a ;\\l"];
+    n2 [label="if  >  a  0 "];
+    n3 [label=" a =  q\\\\\\" ;\\l"];
+  }
+  subgraph cluster_1 {
+    label="f";
+    n4 [label="f()"];
+    n5 [label=" return  1 ;\\l"];
+  }
+  n0 -> n2;
+  n2 -> n3 [label="true"];
+  n3 -> n1;
+  n2 -> n1 [label="false"];
+  n4 -> n5;
+}
+""")
+        out = io.StringIO()
+        cfg.write_dot(out, clusters=False, name='g')
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'digraph g {')
+        self.assertEqual(len(lines), 2 + len(cfg.nodes) + len(cfg.edges))
+
+    def test_write_json(self):
+        prog = parse("""main(a) {
+            while (a > 0) { a = a - 1; }
+            return a;
+        }
+        f() { return 1; }""")
+        cfg = Graph.build_prog(prog)
+        out = io.StringIO()
+        cfg.write_json(out)
+        data = json.loads(out.getvalue())
+        self.assertEqual([n['id'] for n in data['nodes']],
+                         list(range(len(cfg.nodes))))
+        self.assertEqual([n['label'] for n in data['nodes']],
+                         [str(n) for n in cfg.nodes])
+        self.assertEqual([n['function'] for n in data['nodes']],
+                         ['main'] * 4 + ['f'] * 2)
+        self.assertEqual(data['nodes'][2]['kind'], 'Condition')
+        self.assertEqual([(e['source'], e['target'], e['kind'])
+                          for e in data['edges']],
+                         [(e.in_.index, e.out.index, str(e))
+                          for e in cfg.edges])
+        # a graph built by hand, without functions
+        hand = Graph([Nope(), Node(Id('a'))], [])
+        hand.add_edge(*hand.nodes)
+        out = io.StringIO()
+        hand.write_json(out)
+        data = json.loads(out.getvalue())
+        self.assertEqual([n['function'] for n in data['nodes']], [None, None])
+        out = io.StringIO()
+        hand.write_dot(out)
+        self.assertIn('n0 [label=""];', out.getvalue())
+
+    def test_orders(self):
+        prog = parse("""main(a) {
+            var b;
+            while (a > 0) {
+                if (a > 1) { a = a - 2; } else { a = a - 1; }
+            }
+            b = a;
+            return b;
+        }
+        f() { return 1; }""")
+        cfg = Graph.build_prog(prog)
+        rpo = cfg.rpo()
+        self.assertIs(cfg.rpo(), rpo)
+        self.assertEqual(sorted(rpo), list(range(len(cfg.nodes))))
+        self.assertEqual(rpo[0], 0)
+        self.assertEqual([cfg.nodes[i].__class__ for i in rpo[-2:]],
+                         [Entry, Exit])
+        position = {node: i for i, node in enumerate(rpo)}
+        loop = next(n for n in cfg.nodes if isinstance(n, Condition))
+        for edge in cfg.edges:
+            # only the back edges to the loop condition go backwards
+            if position[edge.in_.index] > position[edge.out.index]:
+                self.assertIs(edge.out, loop)
+        self.assertEqual(len(cfg.postorder()), len(rpo))
+        self.assertEqual(cfg.postorder()[:8], rpo[7::-1])
+
+        sccs = cfg.sccs()
+        self.assertEqual(sorted(sum(sccs, [])), list(range(len(cfg.nodes))))
+        component = {node: i for i, nodes in enumerate(sccs)
+                     for node in nodes}
+        for edge in cfg.edges:
+            self.assertLessEqual(component[edge.in_.index],
+                                 component[edge.out.index])
+        [cycle] = [nodes for nodes in sccs if len(nodes) > 1]
+        self.assertEqual(cycle[0], loop.index)
+        self.assertEqual(len(cycle), 4)
+
+        # unreachable nodes are in no order but in a component, before the
+        # nodes they have an edge to
+        node, alone = Node(Id('x')), Node(Id('y'))
+        cfg.add_node(node)
+        cfg.add_node(alone)
+        cfg.add_edge(node, loop)
+        self.assertIsNot(cfg.rpo(), rpo)
+        self.assertNotIn(node.index, cfg.rpo())
+        sccs = cfg.sccs()
+        self.assertEqual(sccs[0], [0])
+        self.assertLess(sccs.index([node.index]), sccs.index(cycle))
+        self.assertEqual(sccs[-1], [alone.index])
+
+        # an unreachable node with an edge to the root comes first
+        nodes = [Node(Id(str(i))) for i in range(5)]
+        cfg = Graph(nodes, [])
+        for i, succs in enumerate([[1, 2], [], [], [1, 1], [0]]):
+            for j in succs:
+                cfg.add_edge(nodes[i], nodes[j])
+        self.assertEqual(cfg.sccs(), [[4], [0], [2], [3], [1]])
+
+    def test_deep_orders(self):
+        cfg = Graph.build_prog(deep_loops())
+        self.assertEqual(len(cfg.rpo()), len(cfg.nodes))
+        # the outermost while and everything it contains
+        self.assertEqual(max(len(c) for c in cfg.sccs()), DEPTH)
+
+    def test_icfg(self):
+        prog = parse("""main(a) {
+            var b, g;
+            b = inc(a);
+            g = inc;
+            b = g(b);
+            b = (twice)(b, a);
+            output inc(b) + 1;
+            return b;
+        }
+        inc(x) { return x + 1; }
+        twice(x, y) { var f; f = 2; x = f(y); return x * 2; }""")
+        icfg = ICFG.build_prog(prog)
+        self.assertEqual(list(icfg.procedures), ['main', 'inc', 'twice'])
+        direct, pointer, parens, local = icfg.calls
+        self.assertEqual((direct.callee, pointer.callee, parens.callee,
+                          local.callee), ('inc', None, 'twice', None))
+        self.assertEqual((direct.caller, local.caller), ('main', 'twice'))
+        self.assertEqual(str(direct), 'call inc (  a )')
+        self.assertIsInstance(direct.after, AfterCallNode)
+        self.assertIs(direct.after.call, direct)
+        entry, exit = icfg.procedures['inc']
+        self.assertEqual([(type(e), e.out) for e in direct.succ_edges()],
+                         [(LocalEdge, direct.after), (CallEdge, entry)])
+        self.assertEqual([(type(e), e.in_) for e in direct.after.pred_edges()],
+                         [(LocalEdge, direct), (ReturnEdge, exit)])
+        self.assertEqual([str(e) for e in direct.succ_edges()],
+                         ['local', 'call'])
+        # the call nested in `output` is an ordinary node
+        self.assertEqual(sum(isinstance(n, CallNode) for n in icfg.nodes), 4)
+        # indirect calls are resolved on demand, the caller goes on
+        self.assertEqual([(type(e), e.out) for e in pointer.succ_edges()],
+                         [(LocalEdge, pointer.after)])
+        # by default every function of one parameter
+        self.assertEqual(icfg.callees(pointer), ['main', 'inc'])
+        self.assertEqual(list(pointer.succ_nodes()),
+                         [pointer.after, icfg.procedures['main'][0], entry])
+        self.assertIs(icfg.callees(pointer), icfg.callees(pointer))
+        icfg.resolve()
+        self.assertEqual(icfg.callees(parens), ['twice'])
+        self.assertEqual(icfg.callees(local), ['main', 'inc'])
+        self.assertEqual(icfg.callees(direct), ['inc'])
+        kinds = icfg.csr().kinds
+        self.assertEqual(sorted(set(kinds)), [EDGE, CALL, RETURN, LOCAL])
+        self.assertEqual(len([e for e in icfg.edges
+                              if isinstance(e, ReturnEdge)]), 6)
+        out = io.StringIO()
+        icfg.write_dot(out)
+        self.assertIn(f'n{direct.index} -> n{entry.index} [label="call"];',
+                      out.getvalue())
+
+    def test_icfg_call_graph(self):
+        prog = parse("""main(a) { var b; b = (a)(a); return b; }
+        f(x) { return x; }
+        g(x) { return 1; }""")
+        icfg = ICFG.build_prog(prog, lambda call, icfg: ['g', 'unknown'])
+        [call] = icfg.calls
+        self.assertEqual(icfg.callees(call), ['g'])
+        self.assertEqual(list(call.succ_nodes()),
+                         [call.after, icfg.procedures['g'][0]])
+        # the intraprocedural graphs are unchanged
+        self.assertEqual(len(icfg.nodes), len(Graph.build_prog(prog).nodes)
+                         + len(icfg.calls))
+
+    def test_icfg_orders(self):
+        prog = parse("""main(a) {
+            var b;
+            b = 0;
+            if (a > 0) { b = f(a); } else { b = (a)(a); }
+            return b;
+        }
+        f(x) { return x; }""")
+        icfg = ICFG.build_prog(prog)
+        direct, pointer = icfg.calls
+        (main, end), (f, f_exit) = icfg.procedures.values()
+        # the caller is whole before the indirect call is resolved
+        rpo = icfg.rpo()
+        self.assertCountEqual(rpo, range(len(icfg.nodes)))
+        self.assertLess(rpo.index(pointer.index), rpo.index(end.index))
+        self.assertEqual(rpo[0], main.index)
+        self.assertCountEqual(icfg.postorder(), rpo)
+        icfg.resolve()
+        rpo = icfg.rpo()
+        self.assertEqual(len(rpo), len(icfg.nodes))
+        position = {node: i for i, node in enumerate(icfg.sccs())
+                    for node in node}
+        self.assertEqual(len(position), len(icfg.nodes))
+        # main calls itself: the call, main and the after-call are one
+        self.assertEqual(position[pointer.index], position[main.index])
+        self.assertEqual(position[pointer.after.index], position[end.index])
+        self.assertLess(position[direct.index], position[f.index])
+        for edge in icfg.edges:
+            self.assertLessEqual(position[edge.in_.index],
+                                 position[edge.out.index])
+        dom = dominators(icfg)
+        self.assertIsNone(dom.immediate_dominator(main))
+        # every function is a root, a return meets the caller under none
+        self.assertIsNone(dom.immediate_dominator(direct.after))
+        self.assertIsNone(dom.immediate_dominator(f))
+        self.assertIs(dom.immediate_dominator(f_exit), f)
+        self.assertTrue(dom.dominates(main, pointer))
+        self.assertIs(dom.immediate_post_dominator(pointer.after), end)
+
+    def test_deep(self):
+        cfg = Graph.build_prog(deep_blocks())
+        # entry, exit and the assignment
+        self.assertEqual(len(cfg.nodes), 4)
+        cfg = Graph.build_prog(deep_loops())
+        conditions = [n for n in cfg.nodes if isinstance(n, Condition)]
+        self.assertEqual(len(conditions), DEPTH)
+        # entry, exit, declaration, two assignments
+        self.assertEqual(len(cfg.nodes), DEPTH + 5)
+        self.assertFalse(any(isinstance(n, Nope) for n in cfg.nodes))
+
+    def test_merge(self):
+        prog = parse("""main(a) {
+            if (a > 0) { } else { if (a < 0) { a = 1; } }
+            while (a > 0) { }
+            return a;
+        }""")
+        cfg = Graph.build_prog(prog)
+        self.assertEqual(len(cfg.nodes), 6)
+        outer, inner, loop = [n for n in cfg.nodes
+                              if isinstance(n, Condition)]
+        self.assertCountEqual([(type(e), e.out) for e in outer.succ_edges()],
+                              [(TrueEdge, loop), (FalseEdge, inner)])
+        self.assertEqual(sorted(type(e).__name__ for e in loop.pred_edges()),
+                         ['Edge', 'FalseEdge', 'TrueEdge', 'TrueEdge'])
+        self.assertEqual([type(e) for e in loop.succ_edges()],
+                         [TrueEdge, FalseEdge])
+
+    def test_eliminate_nope(self):
+        entry, cond, a, b = (Entry(Id('f'), []), Condition(Id('c')),
+                             Node(Id('a')), Node(Id('b')))
+        nopes = [Nope(), Nope()]
+        cfg = Graph([entry, nopes[0], cond, nopes[1], a, b], [])
+        cfg.add_edge(entry, nopes[0])
+        cfg.add_edge(nopes[0], cond)
+        cfg.add_edge(cond, nopes[1], True)
+        cfg.add_edge(cond, a, False)
+        cfg.add_edge(nopes[1], nopes[1])
+        cfg.add_edge(a, nopes[1])
+        cfg.add_edge(nopes[1], b)
+        cfg.eliminate_nope()
+        self.assertEqual(cfg.nodes, [entry, cond, a, b])
+        self.assertEqual(
+            sorted((cfg.nodes.index(e.in_), type(e).__name__,
+                    cfg.nodes.index(e.out)) for e in cfg.edges),
+            [(0, 'Edge', 1), (1, 'FalseEdge', 2), (1, 'TrueEdge', 3),
+             (2, 'Edge', 3)])
+        self.assertEqual(len(list(b.pred_nodes())), 2)
+
+
 if __name__ == '__main__':
     unittest.main()
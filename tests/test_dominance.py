@@ -0,0 +1,185 @@
+import unittest
+
+from tipy.ast import Id
+from tipy.cfg import *
+from tipy.dominance import dominators
+from tipy.parser import parse
+
+from .util import TipyTest, deep_loops
+
+
+def by_label(cfg):
+    return {str(node).strip(): node for node in cfg.nodes}
+
+
+class TestDominance(TipyTest):
+
+    def test_while(self):
+        cfg = Graph.build_func(parse("""f(n) {
+            var r;
+            r = 1;
+            while (n > 0) {
+                r = r * n;
+                n = n - 1;
+            }
+            return r;
+        }""").functions[0])
+        n = by_label(cfg)
+        dom = dominators(cfg)
+        cond = n['if  >  n  0']
+        self.assertIsNone(dom.immediate_dominator(cfg.entry))
+        self.assertIs(dom.immediate_dominator(n['r =  1 ;']), n['var  r ;'])
+        self.assertIs(dom.immediate_dominator(cfg.exit), cond)
+        self.assertIs(dom.immediate_dominator(n['n =  -  n  1 ;']),
+                      n['r =  *  r  n ;'])
+        self.assertTrue(dom.dominates(cfg.entry, cfg.exit))
+        self.assertTrue(dom.dominates(cond, cond))
+        self.assertFalse(dom.dominates(n['r =  *  r  n ;'], cfg.exit))
+        self.assertIs(dom.immediate_post_dominator(n['r =  1 ;']), cond)
+        self.assertIs(dom.immediate_post_dominator(cond), cfg.exit)
+        self.assertIsNone(dom.immediate_post_dominator(cfg.exit))
+        self.assertTrue(dom.post_dominates(cond, n['n =  -  n  1 ;']))
+        # the loop body meets the entry path again at the condition
+        self.assertEqual(dom.frontiers()[n['n =  -  n  1 ;'].index],
+                         [cond.index])
+        self.assertEqual(dom.frontiers()[cond.index], [cond.index])
+        [loop] = dom.loops
+        self.assertEqual(loop.header, cond.index)
+        self.assertEqual(loop.latches, [n['n =  -  n  1 ;'].index])
+        self.assertEqual(sorted(loop.nodes()), sorted(
+            [cond.index, n['r =  *  r  n ;'].index,
+             n['n =  -  n  1 ;'].index]))
+        self.assertIsNone(dom.loop_of[cfg.exit.index])
+
+    def test_if(self):
+        cfg = Graph.build_func(parse("""f(a) {
+            var b;
+            if (a > 0) { b = 1; } else { b = 2; }
+            output b;
+            return b;
+        }""").functions[0])
+        n = by_label(cfg)
+        dom = dominators(cfg)
+        cond, merge = n['if  >  a  0'], n['output  b ;']
+        self.assertIs(dom.immediate_dominator(merge), cond)
+        self.assertIs(dom.immediate_post_dominator(cond), merge)
+        frontiers = dom.frontiers()
+        self.assertEqual(frontiers[n['b =  1 ;'].index], [merge.index])
+        self.assertEqual(frontiers[n['b =  2 ;'].index], [merge.index])
+        self.assertEqual(frontiers[cond.index], [])
+        self.assertEqual(dom.loops, [])
+
+    def test_loop_forest(self):
+        cfg = Graph.build_func(parse("""f(a) {
+            while (a > 0) {
+                while (a > 1) { a = a - 2; }
+                if (a > 2) { while (a > 3) { a = a - 3; } }
+                a = a - 1;
+            }
+            while (a < 0) { a = a + 1; }
+            return a;
+        }""").functions[0])
+        n = by_label(cfg)
+        dom = dominators(cfg)
+        outer, second = dom.loops
+        self.assertEqual(outer.header, n['if  >  a  0'].index)
+        self.assertEqual(second.header, n['if  <  a  0'].index)
+        self.assertEqual([c.header for c in outer.children],
+                         [n['if  >  a  1'].index, n['if  >  a  3'].index])
+        inner = outer.children[1]
+        self.assertIs(inner.parent, outer)
+        self.assertEqual(inner.depth, 2)
+        self.assertIs(dom.loop_of[n['a =  -  a  3 ;'].index], inner)
+        self.assertIs(dom.loop_of[n['if  >  a  2'].index], outer)
+        self.assertEqual(len(outer.nodes()), 7)
+        self.assertEqual(len(outer.body), 3)
+
+    def test_program(self):
+        prog = parse("""f() { return 1; }
+        g(a) { while (a > 0) { a = a - 1; } return a; }""")
+        cfg = Graph.build_prog(prog)
+        dom = dominators(cfg)
+        entries = [node for node in cfg.nodes if isinstance(node, Entry)]
+        for entry in entries:
+            self.assertEqual(dom.idom[entry.index], entry.index)
+        self.assertFalse(dom.dominates(entries[0], entries[1]))
+        self.assertEqual(len(dom.loops), 1)
+        # a function is built into a graph of its own
+        dom = dominators(prog.functions[1])
+        self.assertIsInstance(dom.graph.entry, Entry)
+        self.assertEqual(len(dom.loops), 1)
+
+    def test_merged_roots(self):
+        # a node reached from two entries, and one reaching two exits
+        cfg = Graph.build_prog(parse("""f() { var x; x = 1; return x; }
+        g() { var y; y = 2; return y; }"""))
+        n = by_label(cfg)
+        join, fork = n['return  y ;'], n['x =  1 ;']
+        cfg.add_edge(fork, join)
+        dom = dominators(cfg)
+        self.assertEqual(dom.idom[join.index], join.index)
+        self.assertIsNone(dom.immediate_dominator(join))
+        self.assertIs(dom.immediate_dominator(n['y =  2 ;']), n['var  y ;'])
+        self.assertFalse(dom.dominates(n['g()'], join))
+        self.assertIsNone(dom.immediate_post_dominator(fork))
+        self.assertIs(dom.immediate_post_dominator(n['var  x ;']), fork)
+        self.assertFalse(dom.post_dominates(n['return  x ;'], fork))
+        frontiers = dom.frontiers()
+        self.assertEqual(frontiers[n['f()'].index], [join.index])
+        self.assertEqual(frontiers[n['y =  2 ;'].index], [join.index])
+
+    def test_recursion(self):
+        # the call enters the entry that dominates it
+        icfg = ICFG.build_prog(parse("""main(a) {
+            var b;
+            b = main(a);
+            return b;
+        }"""))
+        [call] = icfg.calls
+        entry, exit = icfg.procedures['main']
+        dom = dominators(icfg)
+        frontiers = dom.frontiers()
+        self.assertEqual(frontiers[entry.index], [entry.index])
+        self.assertEqual(frontiers[call.index], [entry.index])
+        self.assertEqual(frontiers[exit.index], [call.after.index])
+        # the recursive call and the return into the after-call
+        self.assertEqual([loop.header for loop in dom.loops],
+                         [entry.index, call.after.index])
+        # a back edge into the entry of a graph built by hand
+        cfg = Graph.build_func(parse("f() { return 1; }").functions[0])
+        cfg.add_edge(cfg.exit, cfg.entry)
+        frontiers = dominators(cfg).frontiers()
+        self.assertEqual(frontiers[cfg.entry.index], [cfg.entry.index])
+        self.assertEqual(frontiers[cfg.exit.index], [cfg.entry.index])
+
+    def test_cache(self):
+        cfg = Graph.build_func(parse("f() { return 1; }").functions[0])
+        dom = dominators(cfg)
+        self.assertIs(dominators(cfg), dom)
+        # a node nothing reaches
+        node = Node(Id('x'))
+        cfg.add_node(node)
+        cfg.add_edge(node, cfg.exit)
+        dom = dominators(cfg)
+        self.assertIsNot(dom, dominators(Graph.build_func(
+            parse("f() { return 1; }").functions[0])))
+        self.assertEqual(dom.idom[node.index], -1)
+        self.assertIsNone(dom.immediate_dominator(node))
+        self.assertFalse(dom.dominates(cfg.entry, node))
+        self.assertTrue(dom.post_dominates(cfg.exit, node))
+
+    def test_deep(self):
+        depth = 2000
+        cfg = Graph.build_prog(deep_loops(depth))
+        dom = dominators(cfg)
+        loop = dom.loops[0]
+        while loop.children:
+            [loop] = loop.children
+        self.assertEqual(loop.depth, depth // 2)
+        conditions = [n for n in cfg.nodes if isinstance(n, Condition)]
+        for a, b in zip(conditions, conditions[1:]):
+            self.assertIs(dom.immediate_dominator(b), a)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,21 @@
 import unittest
+import logging
+import os
+import subprocess
 import sys
 import io
+import tempfile
+from unittest import mock
 
-from tipy.parser import parse_file
+from lark import Lark, Tree, logger as lark_logger
+from lark.exceptions import UnexpectedInput
+
+from tipy import parser
+from tipy.parser import (parse, parse_file, parse_files, iter_functions,
+                         reparse, Edit, GRAMMAR)
+from tipy.util import SyntaxError
 from tipy.visitor import AstVisitor
+from tipy.ast import *
 
 from .util import TipyTest
 
@@ -22,6 +34,228 @@ class TestParser(TipyTest):
                 _output = buffer.getvalue()
         sys.stdout = sys.__stdout__
 
+    def test_lalr_parity(self):
+        for file in self.file_lists:
+            if file.endswith(".tip"):
+                earley = parse_file("tip_examples/" + file, mode='earley')
+                lalr = parse_file("tip_examples/" + file, mode='lalr')
+                self.assertAstEqual(earley, lalr, file)
+
+    def test_fused(self):
+        for file in self.file_lists:
+            if file.endswith(".tip"):
+                tree = parse_file("tip_examples/" + file, mode='lalr')
+                fused = parse_file("tip_examples/" + file, mode='lalr',
+                                   fused=True)
+                self.assertAstEqual(tree, fused, file)
+        self.assertException(parse, ValueError, "main() { return 0; }",
+                             'earley', True)
+
+    def test_lalr_conflict_free(self):
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        level = lark_logger.level
+        lark_logger.addHandler(handler)
+        lark_logger.setLevel(logging.DEBUG)
+        try:
+            Lark.open(GRAMMAR, parser='lalr', debug=True)
+        finally:
+            lark_logger.removeHandler(handler)
+            lark_logger.setLevel(level)
+        self.assertEqual([m for m in messages if 'conflict' in m], [])
+
+    def test_keywords(self):
+        prog = parse("""main() {
+            var x;
+            x = input;
+            x = null;
+            return alloc x + 1;
+        }""")
+        stmts = prog.functions[0].body.stmts
+        self.assertIsInstance(stmts[0].expr, Input)
+        self.assertEqual(stmts[1].expr, Const(AstType.NULL, None))
+        ret = prog.functions[0].body.returnstmt.expr
+        self.assertIsInstance(ret, BinaryExpr)
+        self.assertIsInstance(ret.left, Alloc)
+
+    def test_dangling_else(self):
+        for mode in ('earley', 'lalr'):
+            prog = parse("""main() {
+                var x;
+                if (x) if (x) x = 1; else x = 2;
+                return x;
+            }""", mode)
+            outer = prog.functions[0].body.stmts[0]
+            self.assertIsNone(outer.else_)
+            self.assertIsNotNone(outer.then.else_)
+
+    def test_grammar_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch.dict(os.environ, {'TIPY_CACHE_DIR': tmp}):
+                cached = parser.grammar_cache_file('lalr')
+                self.assertFalse(os.path.exists(cached))
+                parser.build_parser('lalr')
+                self.assertTrue(os.path.exists(cached))
+                fused = parser.build_parser('lalr', fused=True)
+                self.assertIsInstance(fused.parse("main() { return 0; }"),
+                                      Program)
+                # a different grammar is cached in a different file
+                with open(GRAMMAR) as grammar:
+                    text = grammar.read()
+                with tempfile.NamedTemporaryFile('w', suffix='.lark',
+                                                 delete=False) as f:
+                    f.write(text + '\n// edited\n')
+                try:
+                    with mock.patch.object(parser, 'GRAMMAR', f.name):
+                        self.assertNotEqual(
+                            parser.grammar_cache_file('lalr'), cached)
+                finally:
+                    os.remove(f.name)
+
+    def test_no_cache_dir(self):
+        # the cache directory cannot be made under a file
+        with tempfile.NamedTemporaryFile() as f:
+            with mock.patch.dict(os.environ,
+                                 {'TIPY_CACHE_DIR': f'{f.name}/tipy'}):
+                lalr = parser.build_parser('lalr')
+                self.assertIsInstance(
+                    lalr.parse("main() { return 0; }"), Tree)
+
+    def importtime(self, module: str) -> dict[str, int]:
+        """ cumulative import time in us of every module imported """
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                                 f'import {module}'], capture_output=True,
+                                text=True, check=True)
+        times = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, cumulative, name = line.split('|')
+                if cumulative.strip().isdigit():
+                    times[name.strip()] = int(cumulative)
+        return times
+
+    def test_import_time(self):
+        # the AST and CFG never pay for lark or the grammar
+        for module in ('tipy.ast', 'tipy.cfg'):
+            self.assertNotIn('lark', self.importtime(module), module)
+        # importing the parser neither builds a parser nor compiles the
+        # grammar
+        subprocess.run([sys.executable, '-c', """if True:
+            import lark
+            built = []
+            init = lark.Lark.__init__
+            def record(self, *args, **kwargs):
+                built.append(args)
+                init(self, *args, **kwargs)
+            lark.Lark.__init__ = record
+            import tipy.parser
+            assert not built, built
+            assert tipy.parser.get_parser.cache_info().currsize == 0
+        """], check=True)
+
+    def test_positions(self):
+        text = "main() {\n  var x;\n  x = 1;\n  return x;\n}"
+        prog = parse(text, 'lalr')
+        x_decl = prog.functions[0].body.varstmts[0].ids[0]
+        self.assertEqual((x_decl.line, x_decl.column), (2, 7))
+        self.assertIsNone(Id('y').pos)
+        self.assertEqual(x_decl.pos, (2, 7))
+        # nodes carry no __dict__
+        for node in (x_decl, prog, prog.functions[0].body):
+            self.assertFalse(hasattr(node, '__dict__'), type(node))
+
+    def test_parse_files(self):
+        files = sorted("tip_examples/" + f for f in self.file_lists
+                       if f.endswith(".tip"))
+        with tempfile.NamedTemporaryFile('w', suffix='.tip',
+                                         delete=False) as f:
+            f.write("main() { return ; }")
+        paths = files[:10] + [f.name, "tip_examples/missing.tip"] + files[10:]
+        try:
+            for workers in (1, 2):
+                results = parse_files(paths, workers, 'lalr')
+                self.assertEqual([r.path for r in results], paths)
+                for result in results:
+                    if result.path == f.name:
+                        self.assertIsInstance(result.error, SyntaxError)
+                        self.assertIsNone(result.program)
+                    elif result.path.endswith("missing.tip"):
+                        self.assertIsInstance(result.error, FileNotFoundError)
+                    else:
+                        self.assertIsNone(result.error)
+                        self.assertAstEqual(result.program,
+                                            parse_file(result.path, 'lalr'))
+        finally:
+            os.remove(f.name)
+
+    def test_iter_functions(self):
+        for file in self.file_lists:
+            if not file.endswith(".tip"):
+                continue
+            path = "tip_examples/" + file
+            program = parse_file(path, 'lalr')
+            functions = list(iter_functions(path, 'lalr'))
+            self.assertAstEqual(Program(functions), program, path)
+
+    def test_iter_functions_split(self):
+        text = ('f() { return 1; } g() { var s; s = "}"; /* } */ // }\n'
+                '  return {a: 1}; } /* { */\n'
+                'h(x) { if (x) { output "{"; } return x; }\n// end\n')
+        functions = list(iter_functions(io.StringIO(text), 'lalr'))
+        self.assertAstEqual(Program(functions), parse(text, 'lalr'))
+        self.assertEqual([(f.name.value, f.name.line, f.name.column)
+                          for f in functions],
+                         [('f', 1, 1), ('g', 1, 19), ('h', 3, 1)])
+        self.assertEqual(list(iter_functions(io.StringIO("// nothing\n"))), [])
+
+    def test_iter_functions_error(self):
+        text = "f() { return 1; }\ng() {\n  return 1 +; }\n"
+        functions = iter_functions(io.StringIO(text), 'lalr')
+        self.assertEqual(next(functions).name.value, 'f')
+        with self.assertRaises(UnexpectedInput) as e:
+            next(functions)
+        self.assertEqual((e.exception.line, e.exception.column), (3, 13))
+
+    def test_reparse(self):
+        text = ("f() { return 1; } g() { return 2; }\n"
+                "/* h */ h(x) {\n  output x;\n  return x;\n}\n"
+                "k() { return 0; }\n// */\n")
+        cases = [
+            # inside a function on a shared line
+            (Edit(13, 14, "42"), {0}),
+            # new lines inside h
+            (Edit(60, 60, "\n\n"), {2}),
+            # a new function between h and k
+            (Edit(77, 77, "m() { return 3; }\n"), {3}),
+            # delete g
+            (Edit(18, 35, ""), {1}),
+            # a comment hiding h and k, parsed again from g before it
+            (Edit(41, 43, ""), {1, 2, 3}),
+            # text after the last function
+            (Edit(len(text), len(text), "n() { return 4; }"), set()),
+        ]
+        for edit, changed in cases:
+            program = parse(text, 'lalr')
+            before = list(program.functions)
+            new_text = edit.apply(text)
+            result = reparse(program, text, edit, 'lalr')
+            self.assertAstEqual(result, parse(new_text, 'lalr'), new_text)
+            for i, function in enumerate(before):
+                if i not in changed:
+                    self.assertTrue(any(f is function
+                                        for f in result.functions), edit)
+
+    def test_reparse_error(self):
+        text = "f() { return 1; }\ng() { return 2; }\n"
+        program = parse(text, 'lalr')
+        with self.assertRaises(UnexpectedInput) as e:
+            reparse(program, text, Edit(31, 32, "+"), 'lalr')
+        self.assertEqual((e.exception.line, e.exception.column), (2, 14))
+
+    def test_mode(self):
+        self.assertException(parse, ValueError, "main() { return 0; }", 'cyk')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import zlib
+
+from tipy.ast import *
+from tipy.parser import parse, parse_file
+from tipy.serialize import FormatError, MAGIC
+
+from .util import TipyTest
+
+
+class TestSerialize(TipyTest):
+
+    def test_all_file(self):
+        for file in self.file_lists:
+            if file.endswith(".tip"):
+                prog = parse_file("tip_examples/" + file, 'lalr')
+                self.assertAstEqual(prog, Program.from_bytes(prog.to_bytes()),
+                                    file)
+
+    def test_all_nodes(self):
+        prog = parse("""
+        f(a, b) {
+            var x, y;
+            x = {f: 1, g: "s"};
+            y = x.f.g + (*a).f - (x).g * -3 / b(1, 2);
+            x.f = &y;
+            (*a).f = alloc null;
+            *a = (f)(input, {});
+            if (x == y) { output x; } else { error y; }
+            while (x != 0) x = x - 1;
+            return **a;
+        }
+        g() { return 1000000000000; }
+        """, 'lalr')
+        self.assertAstEqual(prog, Program.from_bytes(prog.to_bytes()))
+        # hand-built nodes the grammar never produces
+        prog.functions[1].body.returnstmt.expr = Const(AstType.INT, -42)
+        prog.functions[0].body.stmts[-1].body = Block([])
+        self.assertAstEqual(prog, Program.from_bytes(prog.to_bytes()))
+
+    def test_format_error(self):
+        data = parse("main() { return 0; }").to_bytes()
+        self.assertTrue(data.startswith(MAGIC))
+        self.assertException(Program.from_bytes, FormatError, b'PICKLE')
+        self.assertException(Program.from_bytes, FormatError, data[:-3])
+        self.assertException(Program.from_bytes, FormatError,
+                             data[:4] + b'\x7f' + data[5:])
+
+    def test_corrupt(self):
+        prog = parse("""main(a) {
+            var x;
+            x = {f: a, g: "s"};
+            if (a > 0) { output x.f; }
+            return x;
+        }""")
+        data = prog.to_bytes()
+        # every flipped byte and every truncation fails the checksum
+        for i in range(len(data)):
+            for flip in (0x01, 0x80, 0xff):
+                corrupt = data[:i] + bytes([data[i] ^ flip]) + data[i + 1:]
+                self.assertException(Program.from_bytes, FormatError, corrupt)
+            self.assertException(Program.from_bytes, FormatError, data[:i])
+
+        def sign(body: bytes) -> bytes:
+            return body + zlib.crc32(body).to_bytes(4, 'little')
+
+        # well signed but malformed
+        body = data[:-4]
+        self.assertAstEqual(prog, Program.from_bytes(sign(body)))
+        for malformed in (body + b'\x00', body.replace(b'main', b'\xffain'),
+                          body[:-1], body.replace(b'main', b'mai')):
+            self.assertException(Program.from_bytes, FormatError,
+                                 sign(malformed))
+        # nodes that do not fit where their parent puts them
+        prog.functions[0].body.returnstmt.expr = Return(Input())
+        self.assertException(Program.from_bytes, FormatError,
+                             prog.to_bytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,11 @@
 import unittest
 
-from tipy.symbol import SymbolTable
-from tipy.parser import parse_file, parse
+from tipy.symbol import SymbolTable, SymbolContext
+from tipy.names import NAMES
+from tipy.parser import parse_file, parse, reparse, Edit
 from tipy.util import SymbolError, get_output
 
-from .util import TipyTest
+from .util import TipyTest, DEPTH, deep_expression, deep_blocks
 
 
 class TestSymbol(TipyTest):
@@ -29,6 +30,124 @@ class TestSymbol(TipyTest):
             else:
                 self.assertEqual(point_line, 'line1')
 
+    def test_interned(self):
+        ast = parse("""main(a) {
+            var b;
+            b = a;
+            return b;
+        }""")
+        params = ast.functions[0].parameters.params
+        stmt = ast.functions[0].body.stmts[0]
+        self.assertEqual(stmt.expr.sym, params[0].sym)
+        self.assertNotEqual(stmt.name.sym, params[0].sym)
+        self.assertEqual(NAMES.name(stmt.name.sym), 'b')
+        self.assertIs(stmt.expr.value, params[0].value)
+        context = SymbolContext()
+        context.push(params[0].sym, params[0])
+        self.assertIs(context.get('a'), params[0])
+        count = len(NAMES)
+        self.assertIsNone(context.get('never_declared_anywhere'))
+        # a miss does not grow the shared table of names
+        self.assertEqual(len(NAMES), count)
+        self.assertIsNone(NAMES.lookup('never_declared_anywhere'))
+
+    def test_scopes(self):
+        context = SymbolContext()
+        context.push('a', 0)
+        context.enter_scope()
+        context.push('a', 1)
+        context.push('b', 1)
+        context.enter_scope()
+        context.push('a', 2)
+        context.push('a', 3)
+        self.assertEqual((context.get('a'), context.get('b')), (3, 1))
+        context.exit_scope()
+        self.assertEqual((context.get('a'), context.get('b')), (1, 1))
+        context.exit_scope()
+        self.assertEqual((context.get('a'), context.get('b')), (0, None))
+        self.assertEqual(context.scopes, [])
+        # a context holds the names it binds, not every name interned
+        for i in range(1000):
+            NAMES.intern(f'unbound_{i}')
+        context.push(f'unbound_{999}', 4)
+        self.assertEqual(len(context.symbols), 3)
+
+    def test_references(self):
+        ast = parse("""main(a) {
+            var b;
+            b = a + main(a);
+            return b;
+        }""")
+        st = SymbolTable.build(ast)
+        a = ast.functions[0].parameters.params[0]
+        self.assertEqual([use.line for use in st.references(a)], [3, 3])
+        name = ast.functions[0].name
+        self.assertEqual(len(st.references(name)), 2)
+        self.assertEqual(st.undefined, [])
+
+    def test_rebuild(self):
+        text = ("f(x) {\n  var y;\n  y = g(x);\n  return y;\n}\n"
+                "g(a) {\n  var b;\n  b = a;\n  return b;\n}\n")
+
+        def bindings(st):
+            return sorted((use.value, use.pos, decl.value, decl.pos)
+                          for use, decl in st.symbols.items())
+
+        for edit in [Edit(64, 65, "a + g(b)"),    # uses of a, b and g
+                     Edit(51, 56, "var c;\n  var b"),
+                     Edit(60, 65, "b = f(a)")]:
+            program = parse(text, 'lalr')
+            st = SymbolTable.build(program)
+            old = program.functions[1]
+            program = reparse(program, text, edit, 'lalr')
+            st.rebuild(old, program.functions[1])
+            fresh = SymbolTable.build(program)
+            self.assertEqual(bindings(st), bindings(fresh), edit)
+            for decl, uses in fresh.uses.items():
+                self.assertEqual(st.references(decl), uses, edit)
+            self.assertEqual(len(st.uses), len(fresh.uses), edit)
+
+        # the rebuilt function comes before one of its callers
+        text = ("f(x) {\n  return x;\n}\n"
+                "g(a) {\n  var b;\n  b = f(a);\n  return b;\n}\n")
+        start = text.index('return x')
+        for edit in [Edit(start, start + 8, "return f(x - 1)"),
+                     Edit(start + 7, start + 8, "z + f(x)")]:
+            program = parse(text, 'lalr')
+            st = SymbolTable.build(program)
+            old = program.functions[0]
+            program = reparse(program, text, edit, 'lalr')
+            try:
+                st.rebuild(old, program.functions[0])
+            except SymbolError:
+                pass
+            fresh = SymbolTable()
+            fresh.walk(program)
+            for decl, uses in fresh.uses.items():
+                self.assertEqual(st.references(decl), uses, edit)
+            self.assertEqual(st.undefined, fresh.undefined, edit)
+        self.assertEqual([use.pos for use in st.references(
+            program.functions[0].name)], [(1, 1), (2, 14), (6, 7)])
+
+        text = ("f(x) {\n  var y;\n  y = g(x);\n  return y;\n}\n"
+                "g(a) {\n  var b;\n  b = a;\n  return b;\n}\n")
+        program = parse(text, 'lalr')
+        st = SymbolTable.build(program)
+        new = parse(Edit(64, 65, "z").apply(text), 'lalr').functions[1]
+        self.assertException(st.rebuild, SymbolError,
+                             program.functions[1], new)
+        self.assertEqual([use.value for use in st.undefined], ['z'])
+        self.assertException(st.rebuild, ValueError,
+                             program.functions[1], program.functions[0])
+
+    def test_deep(self):
+        ast = deep_expression()
+        st = SymbolTable.build(ast)
+        decl = ast.functions[0].body.varstmts[0].ids[0]
+        uses = [name for name, id in st.symbols.items() if id is decl]
+        self.assertEqual(len(uses), DEPTH + 2)
+        SymbolTable.build(deep_blocks())
+
     errors = ['err_notdecl.tip', 'err_decl_use.tip',
               'parsing.tip', 'err_notlocal.tip']
 
@@ -7,7 +7,7 @@ from tipy.ast import Id
 from tipy.type import *
 from tipy.util import TypeError
 
-from .util import TipyTest
+from .util import TipyTest, deep_expression, deep_loops
 
 
 class TestType(TipyTest):
@@ -120,6 +120,12 @@ class TestType(TipyTest):
         func2 = FunctionType([IntType()], IntType())
         self.assertException(unify, TypeError, func1, func2)
 
+    def test_deep(self):
+        for ast in (deep_expression(), deep_loops(2000)):
+            result = TypeAnalysis.run(ast)
+            ret = ast.functions[0].body.returnstmt.expr
+            self.assertEqual(result.get_type(ret), IntType())
+
     def test_hard(self):
         prog = """
         foo (p,x) {
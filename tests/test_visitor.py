@@ -0,0 +1,141 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from tipy.ast import *
+from tipy.parser import parse, parse_file
+from tipy.prettyprinter import PrettyPrinter
+from tipy.visitor import AstVisitor, AstWalker, HANDLERS
+
+from .util import TipyTest, DEPTH, deep_expression, deep_blocks
+
+
+class Recorder(AstVisitor):
+    """ record every node visited, in order """
+
+    def __init__(self):
+        self.nodes = []
+
+
+def recording(name):
+    def handler(self, node):
+        self.nodes.append(node)
+        getattr(AstVisitor, name)(self, node)
+    return handler
+
+
+for _name in HANDLERS.values():
+    setattr(Recorder, _name, recording(_name))
+# handlers added after the class is created need a new table
+Recorder._build_dispatch()
+
+
+class TestVisitor(TipyTest):
+
+    def test_visit_accept(self):
+        for file in self.file_lists:
+            if not file.endswith(".tip"):
+                continue
+            prog = parse_file("tip_examples/" + file, 'lalr')
+            visited, accepted = Recorder(), Recorder()
+            visited.visit(prog)
+            prog.accept(accepted)
+            self.assertGreater(len(visited.nodes), len(prog.functions), file)
+            self.assertEqual([id(n) for n in visited.nodes],
+                             [id(n) for n in accepted.nodes], file)
+
+    def test_override(self):
+        class Ids(AstVisitor):
+            def __init__(self):
+                self.names = []
+
+            def visit_id(self, node):
+                self.names.append(node.value)
+
+        prog = parse_file("tip_examples/fib.tip", 'lalr')
+        ids = Ids()
+        ids.visit(prog)
+        self.assertEqual(ids.names[:6], ['fib', 'n', 'f1', 'f2', 'i', 'temp'])
+        self.assertIs(Ids._dispatch[Id], Ids.visit_id)
+        self.assertIs(AstVisitor._dispatch[Id], AstVisitor.visit_id)
+
+    def test_unknown(self):
+        self.assertException(AstVisitor().visit, TypeError, "main")
+
+    def test_visit_deep(self):
+        class Count(AstVisitor):
+            def __init__(self):
+                self.ids = self.blocks = 0
+
+            def visit_id(self, node):
+                self.ids += 1
+
+            def visit_block(self, node):
+                self.blocks += 1
+                AstVisitor.visit_block(self, node)
+
+        AstVisitor().visit(deep_expression())
+        deep_expression().accept(AstVisitor())
+        count = Count()
+        count.visit(deep_expression())
+        self.assertEqual(count.ids, DEPTH + 4)
+        # overridden handlers still nest, the others do not
+        count = Count()
+        count.visit(deep_blocks(200))
+        self.assertEqual(count.blocks, 200)
+        with redirect_stdout(io.StringIO()):
+            PrettyPrinter().visit(deep_expression().functions[0])
+
+
+    def test_walk_order(self):
+        class Order(AstWalker):
+            def __init__(self):
+                self.events = []
+
+            def enter_binary_expr(self, node):
+                self.events.append(('enter', node.op.value))
+
+            def leave_binary_expr(self, node):
+                self.events.append(('leave', node.op.value))
+
+            def enter_id(self, node):
+                self.events.append(('id', node.value))
+
+            def enter_call(self, node):
+                # only the arguments
+                return node.args
+
+        prog = parse("main() { var a, b; return a * b + f(a - b); }", 'lalr')
+        order = Order()
+        order.walk(prog)
+        self.assertEqual(order.events[3:], [
+            ('enter', '+'), ('enter', '*'), ('id', 'a'), ('id', 'b'),
+            ('leave', '*'), ('enter', '-'), ('id', 'a'), ('id', 'b'),
+            ('leave', '-'), ('leave', '+')])
+
+    def test_walk_deep(self):
+        class Count(AstWalker):
+            def __init__(self):
+                self.ids = self.depth = self.max_depth = 0
+
+            def enter_id(self, node):
+                self.ids += 1
+
+            def enter_block(self, node):
+                self.depth += 1
+                self.max_depth = max(self.max_depth, self.depth)
+
+            def leave_block(self, node):
+                self.depth -= 1
+
+        count = Count()
+        count.walk(deep_expression())
+        # main, a declared, a assigned and every a of the expression
+        self.assertEqual(count.ids, DEPTH + 4)
+        count = Count()
+        count.walk(deep_blocks())
+        self.assertEqual((count.depth, count.max_depth), (0, DEPTH))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,36 @@
+import functools
 import unittest
 import os
 
+from tipy.ast import Id
+from tipy.parser import parse
+
+# nesting depth of the deep programs, far beyond the recursion limit
+DEPTH = 100000
+
+
+@functools.cache
+def deep_expression(depth=DEPTH):
+    """ `return a + a + ... + a;`, a left-nested chain of `depth` additions """
+    return parse('main() { var a; a = 1; return '
+                 + ' + '.join(['a'] * (depth + 1)) + '; }', 'lalr', True)
+
+
+@functools.cache
+def deep_blocks(depth=DEPTH):
+    """ an assignment in `depth` nested blocks """
+    return parse('main() { var a; ' + '{' * depth + 'a = 1;' + '}' * depth
+                 + ' return a; }', 'lalr', True)
+
+
+@functools.cache
+def deep_loops(depth=DEPTH):
+    """ an assignment in `depth` alternately nested `if` and `while` """
+    return parse('main() { var a; a = 1; '
+                 + ''.join('if (a) { ' if i % 2 == 0 else 'while (a) { '
+                           for i in range(depth))
+                 + 'a = a - 1;' + ' }' * depth + ' return a; }', 'lalr', True)
+
 
 class TipyTest(unittest.TestCase):
     file_lists = os.listdir("tip_examples")
@@ -12,3 +42,21 @@ class TipyTest(unittest.TestCase):
             pass
         else:
             raise Exception(f"Should raise {exception.__name__}")
+
+    def assertAstEqual(self, left, right, path='ast'):
+        """ structural equality, `Id`s are compared by name and position """
+        self.assertIs(type(left), type(right), path)
+        match left:
+            case Id():
+                self.assertEqual(left.value, right.value, path)
+                self.assertEqual(left.pos, right.pos, path)
+            case list() | tuple():
+                self.assertEqual(len(left), len(right), path)
+                for i, (l, r) in enumerate(zip(left, right)):
+                    self.assertAstEqual(l, r, f'{path}[{i}]')
+            case _ if hasattr(left, '__dataclass_fields__'):
+                for field in left.__dataclass_fields__:
+                    self.assertAstEqual(getattr(left, field),
+                                        getattr(right, field), f'{path}.{field}')
+            case _:
+                self.assertEqual(left, right, path)